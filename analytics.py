@@ -0,0 +1,120 @@
+import heapq
+import json
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.bech32m import encode_puzzle_hash
+
+# Holders with at least this many NFTs are reported as whales
+WHALE_THRESHOLD = 10
+# Largest holders listed by address in the report
+TOP_HOLDERS = 10
+
+
+def analytics_path(path: str) -> str:
+    """Path of the holder report stored next to a snapshot, e.g. nft_results.analytics.json"""
+    return f"{os.path.splitext(path)[0]}.analytics.json"
+
+
+class HolderStats:
+    """
+    Holder distribution of a snapshot, accumulated one NFT at a time
+    Only a count per holder is kept. Everything else in the report is derived from those counts
+    and from a histogram of them, so no statistic needs another pass over the records.
+    """
+
+    def __init__(self, whale_threshold: int = WHALE_THRESHOLD, top: int = TOP_HOLDERS):
+        self.whale_threshold = whale_threshold
+        self.top = top
+        self.holdings: Counter = Counter()
+        self.excluded_holdings: Counter = Counter()
+
+    def add(self, owner_puzzle_hash: bytes32):
+        """Count an eligible NFT"""
+        self.holdings[owner_puzzle_hash] += 1
+
+    def add_excluded(self, owner_puzzle_hash: bytes32, count: int = 1):
+        """Count NFTs held by an excluded owner, which are not in the snapshot"""
+        self.excluded_holdings[owner_puzzle_hash] += count
+
+    def report(self) -> Dict:
+        nfts = sum(self.holdings.values())
+        holders = len(self.holdings)
+        excluded_nfts = sum(self.excluded_holdings.values())
+        # Number of holders holding each count, ascending by count
+        histogram = sorted(Counter(self.holdings.values()).items())
+        whales = [(count, number) for count, number in histogram if count >= self.whale_threshold]
+        whale_nfts = sum(count * number for count, number in whales)
+        top = heapq.nlargest(self.top, self.holdings.items(), key=lambda holding: holding[1])
+        top_nfts = sum(count for _, count in top)
+
+        return {
+            "nfts": nfts,
+            "unique_holders": holders,
+            "mean_per_holder": nfts / holders if holders else 0,
+            "median_per_holder": median(histogram, holders),
+            "gini": gini(histogram, holders, nfts),
+            "whales": {
+                "threshold": self.whale_threshold,
+                "holders": sum(number for _, number in whales),
+                "nfts": whale_nfts,
+                "share": share(whale_nfts, nfts),
+            },
+            "top_holders": [{"xch_address": encode_puzzle_hash(puzzle_hash, "xch"), "nfts": count,
+                             "share": share(count, nfts)} for puzzle_hash, count in top],
+            "top_holders_share": share(top_nfts, nfts),
+            "excluded": {
+                "holders": len(self.excluded_holdings),
+                "nfts": excluded_nfts,
+                "share": share(excluded_nfts, nfts + excluded_nfts),
+            },
+            "holders_by_count": {str(count): number for count, number in histogram},
+        }
+
+    def write(self, snapshot_path: str) -> Dict:
+        """Write the report next to the snapshot, returning it"""
+        report = self.report()
+        with open(analytics_path(snapshot_path), "w") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def excluded_entries(self) -> Iterable[Tuple[str, int]]:
+        """Excluded owners as (puzzle hash hex, count), for passing counts between processes"""
+        return ((bytes(puzzle_hash).hex(), count) for puzzle_hash, count in self.excluded_holdings.items())
+
+
+def share(part: int, whole: int) -> float:
+    return part / whole if whole else 0
+
+
+def median(histogram: List[Tuple[int, int]], holders: int) -> float:
+    """Median of the counts described by an ascending (count, holders) histogram"""
+    if not holders:
+        return 0
+    middle = [(holders - 1) // 2, holders // 2]
+    values = []
+    seen = 0
+    for count, number in histogram:
+        seen += number
+        while middle and middle[0] < seen:
+            values.append(count)
+            middle.pop(0)
+    return sum(values) / 2
+
+
+def gini(histogram: List[Tuple[int, int]], holders: int, nfts: int) -> float:
+    """
+    Gini coefficient of holdings from an ascending (count, holders) histogram
+    0 when every holder has the same number of NFTs, approaching 1 when one holder has them all.
+    """
+    if not holders or not nfts:
+        return 0
+    # sum of rank * count over holders ranked 1..n in ascending order, a histogram bucket at a time
+    weighted = 0
+    rank = 0
+    for count, number in histogram:
+        weighted += count * (number * rank + number * (number + 1) // 2)
+        rank += number
+    return 2 * weighted / (holders * nfts) - (holders + 1) / holders
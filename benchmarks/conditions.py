@@ -0,0 +1,157 @@
+"""
+Per-spend benchmark of reading a singleton's children from its spend
+Builds NFT transfer spends with a standard p2 puzzle and times parsing every condition into a dict
+at the block cost limit, as the resolver used to, against nft.created_coins, which runs each spend
+with a per-spend cost limit and only reads CREATE_COIN. Fails if the two disagree.
+Also checks that puzzle_layers.owner_from_layers, through nft.owner_from_spend, finds the same owner
+as UncurriedNFT.uncurry with get_metadata_and_phs, over these spends, the stand-in node's spends and
+randomly corrupted copies of both, and fails if any result or exception differs.
+Usage:
+    python3 benchmarks/conditions.py [--spends N] [--runs N]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Callable, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from chia.consensus.default_constants import DEFAULT_CONSTANTS  # noqa: E402
+from chia.types.blockchain_format.program import Program  # noqa: E402
+from chia.types.blockchain_format.serialized_program import SerializedProgram  # noqa: E402
+from chia.types.blockchain_format.sized_bytes import bytes32  # noqa: E402
+from chia.types.coin_spend import CoinSpend, make_spend  # noqa: E402
+from chia.types.condition_opcodes import ConditionOpcode  # noqa: E402
+from chia.util.condition_tools import conditions_dict_for_solution  # noqa: E402
+from chia.util.ints import uint16  # noqa: E402
+from chia.wallet.nft_wallet import nft_puzzles  # noqa: E402
+from chia.wallet.nft_wallet.uncurry_nft import UncurriedNFT  # noqa: E402
+from chia.wallet.puzzles.p2_delegated_puzzle_or_hidden_puzzle import puzzle_for_pk, solution_for_conditions  # noqa: E402
+from chia_rs import AugSchemeMPL, Coin  # noqa: E402
+
+from nft import created_coins, owner_from_spend  # noqa: E402
+from stand_in_node import MINT_HEIGHT, StandInNode  # noqa: E402
+
+
+def nft_spends(count: int, seed: int = 0) -> List[CoinSpend]:
+    """Transfers of count NFTs with the ownership layer, each also making an announcement and a change coin"""
+    rng = random.Random(seed)
+    spends = []
+    for _ in range(count):
+        launcher_id = bytes32(rng.randbytes(32))
+        p2 = puzzle_for_pk(AugSchemeMPL.key_gen(rng.randbytes(32)).get_g1())
+        metadata = Program.to([("u", ["https://example.com/nft.png"]), ("h", rng.randbytes(32)), ("sn", 1)])
+        inner = nft_puzzles.create_ownership_layer_puzzle(launcher_id, b"", p2, uint16(300), bytes32(rng.randbytes(32)))
+        puzzle = nft_puzzles.create_full_puzzle(launcher_id, metadata,
+                                                nft_puzzles.NFT_METADATA_UPDATER.get_tree_hash(), inner)
+        new_owner = bytes32(rng.randbytes(32))
+        conditions = [[51, new_owner, 1, [new_owner]], [51, bytes32(rng.randbytes(32)), 1000],
+                      [60, rng.randbytes(32)]]
+        lineage_proof = [bytes32(rng.randbytes(32)), bytes32(rng.randbytes(32)), 1]
+        solution = Program.to([lineage_proof, 1, [[solution_for_conditions(conditions)]]])
+        coin = Coin(bytes32(rng.randbytes(32)), puzzle.get_tree_hash(), 1)
+        spends.append(make_spend(coin, puzzle, solution))
+    return spends
+
+
+def created_coins_from_dict(spend: CoinSpend) -> List[Coin]:
+    """Every condition parsed into a dict at the cost limit of a whole block"""
+    conditions = conditions_dict_for_solution(spend.puzzle_reveal, spend.solution,
+                                              DEFAULT_CONSTANTS.MAX_BLOCK_COST_CLVM)
+    return [Coin(spend.coin.name(), bytes32(c.vars[0]), int.from_bytes(c.vars[1], byteorder='big'))
+            for c in conditions.get(ConditionOpcode.CREATE_COIN, [])]
+
+
+async def stand_in_spends(node: StandInNode) -> List[CoinSpend]:
+    """Every spend the stand-in node serves: each NFT's launch and transfers"""
+    spends = []
+    for coin_id, place in node.positions.items():
+        spend = await node.get_puzzle_and_solution(coin_id, MINT_HEIGHT + place % (node.transfers + 2))
+        if spend is not None:
+            spends.append(spend)
+    return spends
+
+
+def corrupted(spends: List[CoinSpend], count: int, seed: int = 0) -> List[CoinSpend]:
+    """Copies of random spends with one to three bytes of the puzzle or the solution overwritten"""
+    rng = random.Random(seed)
+    copies = []
+    while len(copies) < count:
+        spend = rng.choice(spends)
+        puzzle, solution = bytearray(bytes(spend.puzzle_reveal)), bytearray(bytes(spend.solution))
+        target = puzzle if rng.random() < 0.5 else solution
+        for _ in range(rng.randint(1, 3)):
+            target[rng.randrange(len(target))] = rng.randrange(256)
+        try:
+            copies.append(make_spend(spend.coin, SerializedProgram.from_bytes(bytes(puzzle)),
+                                     SerializedProgram.from_bytes(bytes(solution))))
+        except Exception:
+            # No longer a single serialized program
+            continue
+    return copies
+
+
+def owner_from_uncurry(spend: CoinSpend) -> Optional[bytes32]:
+    """The owner as found by chia's own NFT parsing, which owner_from_layers skips where it can"""
+    unft = UncurriedNFT.uncurry(*Program.from_bytes(bytes(spend.puzzle_reveal)).uncurry())
+    if unft is None:
+        return None
+    try:
+        return nft_puzzles.get_metadata_and_phs(unft, spend.solution)[1]
+    except AssertionError:
+        return None
+
+
+def outcome(function: Callable[[CoinSpend], Optional[bytes32]], spend: CoinSpend) -> Tuple[str, object]:
+    """The result of function, or the type of the exception it raised"""
+    try:
+        return "owner", function(spend)
+    except Exception as e:
+        return "raised", type(e)
+
+
+def per_spend_us(function: Callable[[CoinSpend], List[Coin]], spends: List[CoinSpend], runs: int) -> float:
+    """Fastest run's time per spend in microseconds"""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        for spend in spends:
+            function(spend)
+        best = min(best, time.perf_counter() - start)
+    return best / len(spends) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--spends", type=int, default=200, help="NFT spends to build (default: 200)")
+    parser.add_argument("--runs", type=int, default=5, help="runs per case, the fastest is reported")
+    parser.add_argument("--corrupted", type=int, default=2000,
+                        help="corrupted spends to compare owners over (default: 2000)")
+    args = parser.parse_args()
+
+    spends = nft_spends(args.spends)
+    mismatches = sum(created_coins(spend) != created_coins_from_dict(spend) for spend in spends)
+
+    owner_spends = spends + asyncio.run(stand_in_spends(StandInNode(32, transfers=2)))
+    owner_spends += corrupted(owner_spends, args.corrupted)
+    owner_mismatches = sum(outcome(owner_from_spend, spend) != outcome(owner_from_uncurry, spend)
+                           for spend in owner_spends)
+
+    baseline = per_spend_us(created_coins_from_dict, spends, args.runs)
+    current = per_spend_us(created_coins, spends, args.runs)
+    print(f"{'conditions dict, block cost limit':<40} {baseline:8.1f} us/spend")
+    print(f"{'created_coins, spend cost limit':<40} {current:8.1f} us/spend  ({baseline / current:.1f}x)")
+    print(f"{len(owner_spends)} spends compared with UncurriedNFT, {owner_mismatches} with a different owner")
+    if mismatches:
+        print(f"FAIL {mismatches} spends created different coins")
+    if owner_mismatches:
+        print(f"FAIL {owner_mismatches} spends resolved to a different owner")
+    sys.exit(1 if mismatches or owner_mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Import-time benchmark for the command line entry points
+Runs each case in a fresh interpreter with -X importtime, reports the import time and fails when a
+case goes over its budget or a cache-only path loads the node, wallet or HTTP stacks.
+Usage:
+    python3 benchmarks/import_time.py [--runs N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Set, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that only the scan and serve paths may load
+HEAVY_MODULES = ("chia.rpc", "chia.wallet", "chia.consensus", "chia.full_node", "requests", "aiohttp")
+
+# (name, arguments to the interpreter, import budget in milliseconds)
+CASES = [
+    ("find_owners --help", ["find_owners.py", "--help"], 150),
+    ("import find_owners", ["-c", "import find_owners"], 150),
+    ("find_owners draw --help", ["find_owners.py", "draw", "--help"], 150),
+]
+
+
+def measure(args: List[str]) -> Tuple[float, Set[str]]:
+    """Total import time in milliseconds and the set of modules imported"""
+    completed = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=REPO_ROOT,
+                               capture_output=True, text=True)
+    total_us = 0
+    modules = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip())
+        # Top level imports are not indented, their cumulative time includes everything below them
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="runs per case, the fastest is reported")
+    args = parser.parse_args()
+
+    failed = False
+    for name, case_args, budget_ms in CASES:
+        results = [measure(case_args) for _ in range(args.runs)]
+        best_ms = min(ms for ms, _ in results)
+        heavy = sorted(m for m in results[0][1] if m.startswith(HEAVY_MODULES))
+
+        status = "ok"
+        if heavy:
+            status = f"FAIL loads {', '.join(heavy[:3])}{'...' if len(heavy) > 3 else ''}"
+            failed = True
+        elif best_ms > budget_ms:
+            status = "FAIL over budget"
+            failed = True
+        print(f"{name:<40} {best_ms:8.1f} ms  (budget {budget_ms} ms)  {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
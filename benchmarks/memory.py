@@ -0,0 +1,131 @@
+"""
+Memory footprint of resolving synthetic collections against a stand-in node
+Each size runs in its own process: the collection is listed into the metadata index, resolved with
+resolve_batches, drawn from and written out as a snapshot, as a scan would. tracemalloc measures
+the pipeline's peak, the node's own data is built before tracing starts, and peak RSS is read
+for the whole process.
+Usage:
+    python3 benchmarks/memory.py [--sizes 10000,100000,1000000] [--transfers N] [--memory-budget MIB]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+TRAITS = ("background", "body", "head wear")
+
+
+def collection_item(index: int, nft_id: str) -> Dict:
+    """A MintGarden listing item with a few traits"""
+    return {
+        "encoded_id": nft_id,
+        "name": f"Stand-in #{index + 1}",
+        "edition_number": index + 1,
+        "attributes": [{"trait_type": trait, "value": f"{trait} {index % 7}"} for trait in TRAITS],
+    }
+
+
+async def run_pipeline(node, budget) -> int:
+    """List, resolve, draw and write the snapshot; returns the number of owner records spilled to disk"""
+    from draw import hash_draw
+    from find_owners import listing_from_item, resolve_batches
+    from metadata_index import MetadataIndex, NFTMetadata
+    from snapshot import write_snapshot
+    from sorting import external_sort
+
+    listings_by_id = {}
+    metadata = MetadataIndex()
+    for index, nft_id in enumerate(node.nft_ids):
+        item = collection_item(index, nft_id)
+        listings_by_id[nft_id] = listing_from_item(item)
+        metadata.add(NFTMetadata.from_item(item))
+
+    nft_ids = list(listings_by_id)
+    batches = (nft_ids[start:start + 100] for start in range(0, len(nft_ids), 100))
+    results, errors = await resolve_batches(node, batches, listings_by_id, node.target_height, excluded=frozenset(),
+                                            memory_budget=budget)
+    if errors or len(results) != node.count:
+        raise Exception(f"{len(errors)} NFTs failed to resolve, {len(results)} of {node.count} resolved")
+
+    spilled = getattr(results, "spilled", 0)
+    hash_draw(bytes(32), (record.nft_id for record in results), 10)
+    with tempfile.TemporaryDirectory() as directory:
+        write_snapshot(os.path.join(directory, "nft_results.json"), external_sort(results))
+    return spilled
+
+
+def measure(size: int, transfers: int, memory_budget: Optional[int]) -> Dict:
+    from spill import budget_from_mib, resident_memory
+    from stand_in_node import StandInNode
+
+    node = StandInNode(size, transfers)
+    rss_before = resident_memory()
+    budget = budget_from_mib(memory_budget)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        spilled = asyncio.run(run_pipeline(node, budget))
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "size": size,
+        "seconds": seconds,
+        "traced_peak": peak,
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        "peak_rss": peak_rss if sys.platform == "darwin" else peak_rss * 1024,
+        "rss_before": rss_before,
+        "spilled": spilled,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000",
+                        help="collection sizes, comma separated (default: 10000,100000; 1000000 takes a while)")
+    parser.add_argument("--transfers", type=int, default=1, help="transfers of each NFT after minting (default: 1)")
+    parser.add_argument("--memory-budget", type=int, metavar="MIB", help="run the pipeline under this budget")
+    parser.add_argument("--one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one is not None:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        print(json.dumps(measure(args.one, args.transfers, args.memory_budget)))
+        return
+
+    budget = [] if args.memory_budget is None else ["--memory-budget", str(args.memory_budget)]
+    print(f"{'NFTs':>9} {'seconds':>9} {'traced peak':>12} {'bytes/NFT':>10} {'peak RSS':>10} "
+          f"{'RSS growth':>11} {'spilled':>9}")
+    failed = False
+    for size in (int(size) for size in args.sizes.split(",")):
+        child = subprocess.run([sys.executable, __file__, "--one", str(size), "--transfers", str(args.transfers),
+                                *budget], capture_output=True, text=True)
+        if child.returncode != 0:
+            print(f"{size:>9} FAIL\n{child.stderr}")
+            failed = True
+            continue
+
+        row = json.loads(child.stdout.splitlines()[-1])
+        growth = row["peak_rss"] - row["rss_before"]
+        print(f"{size:>9} {row['seconds']:>9.1f} {row['traced_peak'] / 2 ** 20:>8.1f} MiB "
+              f"{row['traced_peak'] / size:>10.0f} {row['peak_rss'] / 2 ** 20:>6.0f} MiB "
+              f"{growth / 2 ** 20:>7.0f} MiB {row['spilled']:>9}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Offline check of --node-db's SQLite client against the stand-in node
+Writes every coin record of a stand-in collection into a database with the full node's coin_record
+schema, some unspent coins with a spent_index of -1, then asks SQLiteFullNodeClient and the
+stand-in node for the same records by name, parent id and puzzle hash. Fails if any answer
+differs, or if a lookup takes other than one query per SQL_BATCH_SIZE ids. Needs no node.
+Usage:
+    python3 benchmarks/node_db_check.py [--nfts N]
+"""
+import argparse
+import asyncio
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+from typing import List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from chia.types.blockchain_format.sized_bytes import bytes32  # noqa: E402
+from chia.types.coin_record import CoinRecord  # noqa: E402
+from chia.wallet.nft_wallet import nft_puzzles  # noqa: E402
+
+from node_db import SQL_BATCH_SIZE, SQLiteFullNodeClient, write_coin_records  # noqa: E402
+from stand_in_node import MINT_HEIGHT, StandInNode  # noqa: E402
+
+
+def by_name(records: List[CoinRecord]) -> List[CoinRecord]:
+    return sorted(records, key=lambda record: record.name)
+
+
+async def check(nfts: int) -> List[str]:
+    """Failures of every lookup, as messages"""
+    node = StandInNode(nfts, transfers=2)
+    coin_ids = list(node.positions)
+    records = await node.get_coin_records_by_names(coin_ids)
+    unspent = [record.name for record in records if not record.spent]
+
+    path = os.path.join(tempfile.mkdtemp(), "blockchain_v2_stand_in.sqlite")
+    write_coin_records(path, records)
+    # Read back as unspent, like the rows the node stores with spent_index 0
+    db = sqlite3.connect(path)
+    with db:
+        db.executemany("UPDATE coin_record SET spent_index = -1 WHERE coin_name = ?",
+                       [(bytes(name),) for name in unspent[::2]])
+    db.close()
+    client = SQLiteFullNodeClient(node, path)
+
+    failures = []
+
+    def compare(lookup: str, got: List[CoinRecord], expected: List[CoinRecord], ids: int, queries: int):
+        if by_name(got) != by_name(expected):
+            failures.append(f"{lookup}: {len(set(got) ^ set(expected))} records differ from the stand-in node's")
+        if queries != math.ceil(ids / SQL_BATCH_SIZE):
+            failures.append(f"{lookup}: {queries} queries for {ids} ids")
+
+    if await client.get_coin_record_by_name(unspent[0]) != await node.get_coin_record_by_name(unspent[0]):
+        failures.append("by name: a coin stored with spent_index -1 differs")
+    if await client.get_coin_record_by_name(bytes32(bytes(32))) is not None:
+        failures.append("by name: an unknown coin was found")
+
+    # Duplicates and unknown ids are dropped from the queries and from the answer
+    names = coin_ids + coin_ids[:10] + [bytes32(bytes(32))]
+    queries = client.queries
+    got = await client.get_coin_records_by_names(names)
+    compare("by names", got, records, len(coin_ids) + 1, client.queries - queries)
+
+    start_height, end_height = MINT_HEIGHT, MINT_HEIGHT + 2
+    queries = client.queries
+    got = await client.get_coin_records_by_parent_ids(coin_ids, start_height=start_height, end_height=end_height)
+    expected = await node.get_coin_records_by_parent_ids(coin_ids, start_height=start_height, end_height=end_height)
+    compare("by parent ids", got, expected, len(coin_ids), client.queries - queries)
+
+    puzzle_hashes = node.puzzle_hashes + [nft_puzzles.LAUNCHER_PUZZLE_HASH]
+    queries = client.queries
+    got = await client.get_coin_records_by_puzzle_hashes(puzzle_hashes, end_height=end_height)
+    expected = await node.get_coin_records_by_puzzle_hashes(puzzle_hashes, end_height=end_height)
+    compare("by puzzle hashes", got, expected, len(puzzle_hashes), client.queries - queries)
+
+    client.close()
+    os.remove(path)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nfts", type=int, default=1_000, help="NFTs in the stand-in collection (default: 1000)")
+    args = parser.parse_args()
+
+    failures = asyncio.run(check(args.nfts))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print(f"SQLite client matches the stand-in node over {args.nfts} NFTs")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Performance regression gate for the resolver and the draw
+Measures node calls per NFT, NFTs per second against a stand-in node that waits a fixed latency
+on every call, and the time to draw from a million entries. Call counts are compared to
+benchmarks/baseline.json, which is committed, and fail the gate if they grow at all. Timings
+depend on the machine, so they are only compared to benchmarks/baseline.local.json, recorded on
+this machine with --update, and fail when they regress by more than the threshold. Needs no node
+and no network.
+Usage:
+    python3 benchmarks/regression.py [--threshold 0.2] [--runs N] [--update]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+LOCAL_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.local.json")
+
+# NFTs and transfers per NFT of the stand-in collections
+RPC_NFTS = 200
+THROUGHPUT_NFTS = 1_000
+TRANSFERS = 3
+# Seconds the stand-in node waits on every call when measuring throughput
+LATENCY = 0.005
+DRAW_ENTRIES = 1_000_000
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+
+
+async def resolve(node, nft_ids: List[str], timelines: bool = False):
+    """Resolve nft_ids at the node's target height through the scan's client wrappers"""
+    from find_owners import resolve_batches, wrap_node_client
+    from records import NFTListing
+
+    client = await wrap_node_client(node)
+    listings_by_id = {nft_id: NFTListing(nft_id, f"Stand-in #{i + 1}", i + 1) for i, nft_id in enumerate(nft_ids)}
+    batches = (nft_ids[start:start + 100] for start in range(0, len(nft_ids), 100))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results, errors = await resolve_batches(client, batches, listings_by_id, node.target_height,
+                                                excluded=frozenset(), timelines={} if timelines else None)
+    if errors or len(results) != len(nft_ids):
+        raise Exception(f"{len(errors)} of {len(nft_ids)} NFTs failed to resolve")
+
+
+def rpcs_per_nft(timelines: bool) -> float:
+    from stand_in_node import StandInNode
+
+    node = StandInNode(RPC_NFTS, TRANSFERS)
+    asyncio.run(resolve(node, node.nft_ids, timelines))
+    return node.calls / RPC_NFTS
+
+
+def nfts_per_second(runs: int) -> float:
+    from stand_in_node import StandInNode
+
+    node = StandInNode(THROUGHPUT_NFTS, TRANSFERS, LATENCY)
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        asyncio.run(resolve(node, node.nft_ids))
+        best = min(best, time.perf_counter() - start)
+    return THROUGHPUT_NFTS / best
+
+
+def draw_seconds(runs: int) -> float:
+    from draw import hash_draw
+
+    # Well-formed ids without a valid checksum, which the draw does not check
+    rng = random.Random(0)
+    nft_ids = ["nft1" + "".join(rng.choices(BECH32_CHARSET, k=52)) + "qqqqqq" for _ in range(DRAW_ENTRIES)]
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        hash_draw(bytes(32), nft_ids, 10)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# (name, unit, whether higher is better, measurement given the number of runs)
+METRICS: List[Tuple[str, str, bool, Callable[[int], float]]] = [
+    ("resolve_rpcs_per_nft", "calls", False, lambda runs: rpcs_per_nft(False)),
+    ("timeline_rpcs_per_nft", "calls", False, lambda runs: rpcs_per_nft(True)),
+    ("resolve_nfts_per_second", "NFTs/s", True, nfts_per_second),
+    ("draw_1m_seconds", "s", False, draw_seconds),
+]
+
+
+def is_call_count(name: str) -> bool:
+    return name.endswith("rpcs_per_nft")
+
+
+def load_metrics(path: str) -> Dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["metrics"]
+
+
+def regressed(name: str, higher_is_better: bool, baseline: float, current: float, threshold: float) -> bool:
+    # Call counts are deterministic, so any increase is a regression
+    if is_call_count(name):
+        return current > baseline + 1e-9
+    if higher_is_better:
+        return current < baseline * (1 - threshold)
+    return current > baseline * (1 + threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="fraction a timing may regress by before the gate fails (default: 0.2)")
+    parser.add_argument("--runs", type=int, default=3, help="runs per timing, the best is kept (default: 3)")
+    parser.add_argument("--update", action="store_true",
+                        help=f"write the call counts to {BASELINE_PATH} and the timings to {LOCAL_BASELINE_PATH}")
+    args = parser.parse_args()
+
+    # Call counts from the committed baseline, timings only from one recorded on this machine
+    baseline = {name: value for name, value in load_metrics(BASELINE_PATH).items() if is_call_count(name)}
+    baseline.update((name, value) for name, value in load_metrics(LOCAL_BASELINE_PATH).items()
+                    if not is_call_count(name))
+
+    current: Dict[str, float] = {}
+    failed = False
+    for name, unit, higher_is_better, measure in METRICS:
+        current[name] = value = measure(args.runs)
+        if name not in baseline:
+            hint = "" if is_call_count(name) else ", record one on this machine with --update"
+            print(f"{name:<26} {value:>12.4g} {unit:<7} (no baseline{hint})")
+            continue
+
+        change = value / baseline[name] - 1 if baseline[name] else 0
+        status = "ok"
+        if regressed(name, higher_is_better, baseline[name], value, args.threshold):
+            status = "REGRESSED"
+            failed = True
+        print(f"{name:<26} {value:>12.4g} {unit:<7} baseline {baseline[name]:>10.4g}  {change:+7.1%}  {status}")
+
+    if args.update:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({"metrics": {name: value for name, value in current.items() if is_call_count(name)}}, f,
+                      indent=2)
+        with open(LOCAL_BASELINE_PATH, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "metrics": {name: value for name, value in current.items() if not is_call_count(name)}}, f,
+                      indent=2)
+        print(f"Baselines written to {BASELINE_PATH} and {LOCAL_BASELINE_PATH}")
+        return
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+In-process stand-in for the full node RPC client, serving a synthetic NFT collection
+Every NFT is launched and minted to an owner, then transferred a number of times. The spends are
+real NFT spends with the ownership layer and a standard p2 puzzle, which the resolver runs and
+decodes like any other, but NFTs share a handful of template puzzles and solutions, so a
+collection of a million costs hashing coin ids rather than currying a million puzzles.
+"""
+import asyncio
+import hashlib
+from typing import Dict, List, Optional
+
+from chia.types.blockchain_format.program import Program
+from chia.types.blockchain_format.serialized_program import SerializedProgram
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.coin_record import CoinRecord
+from chia.types.coin_spend import CoinSpend, make_spend
+from chia.util.bech32m import encode_puzzle_hash
+from chia.util.ints import uint16, uint32, uint64
+from chia.wallet.nft_wallet import nft_puzzles
+from chia.wallet.puzzles.p2_delegated_puzzle_or_hidden_puzzle import puzzle_for_pk, solution_for_conditions
+from chia_rs import AugSchemeMPL, Coin
+
+# Owners the template spends cycle through; NFT i is minted to owner i % TEMPLATE_OWNERS
+TEMPLATE_OWNERS = 16
+# Height the collection is minted at, each transfer is one block later
+MINT_HEIGHT = 1_000
+TEMPLATE_LAUNCHER_ID = bytes32(hashlib.sha256(b"stand-in launcher").digest())
+
+
+def template_owner(k: int) -> Program:
+    return puzzle_for_pk(AugSchemeMPL.key_gen(hashlib.sha256(b"stand-in owner %d" % k).digest()).get_g1())
+
+
+def template_puzzle(owner: Program) -> Program:
+    metadata = Program.to([("u", ["https://example.com/nft.png"]), ("h", bytes(32)), ("sn", 1)])
+    inner = nft_puzzles.create_ownership_layer_puzzle(TEMPLATE_LAUNCHER_ID, b"", owner, uint16(300),
+                                                      bytes32(bytes(32)))
+    return nft_puzzles.create_full_puzzle(TEMPLATE_LAUNCHER_ID, metadata,
+                                          nft_puzzles.NFT_METADATA_UPDATER.get_tree_hash(), inner)
+
+
+class StandInNode:
+    """
+    Answers the resolver's full node calls for count NFTs, each transferred `transfers` times
+    Coin records and spends are rebuilt on request from the NFT's index; only a map from coin id
+    to its place in a lineage is kept. latency seconds are awaited on every call, and calls
+    counts them.
+    """
+
+    def __init__(self, count: int, transfers: int = 1, latency: float = 0):
+        self.count = count
+        self.transfers = transfers
+        self.latency = latency
+        self.calls = 0
+
+        owners = [template_owner(k) for k in range(TEMPLATE_OWNERS)]
+        self.owner_hashes = [owner.get_tree_hash() for owner in owners]
+        puzzles = [template_puzzle(owner) for owner in owners]
+        self.puzzle_hashes = [puzzle.get_tree_hash() for puzzle in puzzles]
+        # Serialized once here, make_spend would otherwise serialize them again on every call
+        self.puzzles = [SerializedProgram.from_program(puzzle) for puzzle in puzzles]
+        self.launcher_puzzle = SerializedProgram.from_program(nft_puzzles.LAUNCHER_PUZZLE)
+        self.launcher_solutions = [SerializedProgram.from_program(Program.to([puzzle_hash, 1, []]))
+                                   for puzzle_hash in self.puzzle_hashes]
+        # Spending owner k's NFT moves it to owner k + 1
+        self.transfer_solutions = []
+        for k in range(TEMPLATE_OWNERS):
+            new_owner = self.owner_hashes[(k + 1) % TEMPLATE_OWNERS]
+            conditions = [[51, new_owner, 1, [new_owner]]]
+            lineage_proof = [bytes32(bytes(32)), bytes32(bytes(32)), 1]
+            solution = Program.to([lineage_proof, 1, [[solution_for_conditions(conditions)]]])
+            self.transfer_solutions.append(SerializedProgram.from_program(solution))
+
+        # Coin id -> index * (transfers + 2) + position in the lineage, the launcher being position 0
+        self.positions: Dict[bytes32, int] = {}
+        self.nft_ids: List[str] = []
+        for index in range(count):
+            lineage = self._lineage(index)
+            for position, coin in enumerate(lineage):
+                self.positions[coin.name()] = index * (transfers + 2) + position
+            self.nft_ids.append(encode_puzzle_hash(lineage[0].name(), "nft"))
+
+    @property
+    def target_height(self) -> int:
+        """Height at which every NFT has made all its transfers"""
+        return MINT_HEIGHT + self.transfers
+
+    def owner_at_target(self, index: int) -> bytes32:
+        return self.owner_hashes[(index + self.transfers) % TEMPLATE_OWNERS]
+
+    def _lineage(self, index: int, length: Optional[int] = None) -> List[Coin]:
+        """Launcher, eve coin and every later coin of NFT index"""
+        length = self.transfers + 2 if length is None else length
+        parent = bytes32(hashlib.sha256(b"stand-in %d" % index).digest())
+        coins = [Coin(parent, nft_puzzles.LAUNCHER_PUZZLE_HASH, uint64(1))]
+        for position in range(1, length):
+            puzzle_hash = self.puzzle_hashes[(index + position - 1) % TEMPLATE_OWNERS]
+            coins.append(Coin(coins[-1].name(), puzzle_hash, uint64(1)))
+        return coins
+
+    def _locate(self, coin_id: bytes32):
+        place = self.positions.get(coin_id)
+        if place is None:
+            return None
+        index, position = divmod(place, self.transfers + 2)
+        return index, position, self._lineage(index, position + 1)[position]
+
+    def _record(self, position: int, coin: Coin) -> CoinRecord:
+        # The launcher is created and spent in the minting block, each later coin is spent one block after it
+        confirmed = MINT_HEIGHT + max(position - 1, 0)
+        spent = MINT_HEIGHT + position if position <= self.transfers else 0
+        return CoinRecord(coin, uint32(confirmed), uint32(spent), False, uint64(0))
+
+    async def _call(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def get_coin_record_by_name(self, coin_id: bytes32) -> Optional[CoinRecord]:
+        await self._call()
+        located = self._locate(coin_id)
+        if located is None:
+            return None
+        _, position, coin = located
+        return self._record(position, coin)
+
+    async def get_coin_records_by_names(self, names: List[bytes32], include_spent_coins: bool = True,
+                                        start_height: Optional[int] = None,
+                                        end_height: Optional[int] = None) -> List[CoinRecord]:
+        await self._call()
+        records = []
+        for name in names:
+            located = self._locate(name)
+            if located is not None:
+                records.append(self._record(located[1], located[2]))
+        return records
+
+    async def get_coin_records_by_parent_ids(self, parent_ids: List[bytes32], include_spent_coins: bool = True,
+                                             start_height: Optional[int] = None,
+                                             end_height: Optional[int] = None) -> List[CoinRecord]:
+        await self._call()
+        records = []
+        for parent_id in parent_ids:
+            located = self._locate(parent_id)
+            if located is None or located[1] > self.transfers:
+                continue
+            index, position, _ = located
+            child = self._lineage(index, position + 2)[position + 1]
+            record = self._record(position + 1, child)
+            if ((start_height is None or record.confirmed_block_index >= start_height)
+                    and (end_height is None or record.confirmed_block_index < end_height)):
+                records.append(record)
+        return records
+
+    async def get_coin_records_by_puzzle_hashes(self, puzzle_hashes: List[bytes32], include_spent_coins: bool = True,
+                                                start_height: Optional[int] = None,
+                                                end_height: Optional[int] = None) -> List[CoinRecord]:
+        # Scans every coin, the templates make puzzle hashes shared by many NFTs
+        await self._call()
+        wanted = set(puzzle_hashes)
+        records = []
+        for coin_id in self.positions:
+            _, position, coin = self._locate(coin_id)
+            record = self._record(position, coin)
+            if (coin.puzzle_hash in wanted and (include_spent_coins or not record.spent)
+                    and (start_height is None or record.confirmed_block_index >= start_height)
+                    and (end_height is None or record.confirmed_block_index < end_height)):
+                records.append(record)
+        return records
+
+    async def get_puzzle_and_solution(self, coin_id: bytes32, height: int) -> Optional[CoinSpend]:
+        await self._call()
+        located = self._locate(coin_id)
+        if located is None:
+            return None
+        index, position, coin = located
+        if position > self.transfers or MINT_HEIGHT + position != height:
+            return None
+        if position == 0:
+            solution = self.launcher_solutions[index % TEMPLATE_OWNERS]
+            return make_spend(coin, self.launcher_puzzle, solution)
+        k = (index + position - 1) % TEMPLATE_OWNERS
+        return make_spend(coin, self.puzzles[k], self.transfer_solutions[k])
+
+    def close(self):
+        pass
+
+    async def await_closed(self):
+        pass
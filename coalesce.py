@@ -0,0 +1,59 @@
+import asyncio
+from typing import Dict, Hashable, Tuple
+
+from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+
+
+class SingleFlightFullNodeClient:
+    """
+    FullNodeRpcClient wrapper that merges identical concurrent calls into one request
+    While a call is in flight, any other call to the same method with the same arguments waits
+    for its result instead of going to the node. Results and errors are shared by every waiter;
+    a waiter that is cancelled or times out does not cancel the request for the others.
+    """
+
+    def __init__(self, client: FullNodeRpcClient):
+        self.client = client
+        self.in_flight: Dict[Tuple, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            key = _call_key(name, args, kwargs)
+            if key is None:
+                return await attr(*args, **kwargs)
+
+            task = self.in_flight.get(key)
+            if task is None:
+                self.calls += 1
+                task = asyncio.ensure_future(attr(*args, **kwargs))
+                self.in_flight[key] = task
+                task.add_done_callback(lambda done: self._finished(key, done))
+            else:
+                self.coalesced += 1
+            return await asyncio.shield(task)
+
+        return call
+
+    def _finished(self, key: Tuple, task: asyncio.Task):
+        self.in_flight.pop(key, None)
+        # Mark the error as retrieved in case every waiter went away before it was raised
+        if not task.cancelled():
+            task.exception()
+
+
+def _call_key(name: str, args: Tuple, kwargs: Dict) -> Hashable:
+    # Lists of coin ids are the only unhashable arguments the resolver passes
+    key = (name,
+           tuple(tuple(a) if isinstance(a, list) else a for a in args),
+           tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
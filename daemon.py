@@ -0,0 +1,148 @@
+import asyncio
+import json
+from typing import Optional
+
+from aiohttp import web
+from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.bech32m import decode_puzzle_hash
+from draw import HASH_SAMPLER, LEGACY_SAMPLER, SAMPLERS, hash_draw, legacy_draw_positions
+from exclusions import load_exclusions
+from find_owners import EXCLUDED_NFT_SET, connect_full_node, fetch_collection_pages, wrap_node_client
+from follower import BlockFollower
+from ownership import OwnershipIndex
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8650
+
+
+class HolderService:
+    """
+    Keeps a collection's ownership index warm and serves it over HTTP
+    Endpoints:
+        GET /owners               eligible holders at the latest followed height
+        GET /holder/{address}     NFTs held by an xch address
+        GET /draw?winners=N       winners drawn from the current snapshot (&sampler=legacy for the old draw)
+    """
+
+    def __init__(self, client: FullNodeRpcClient, collection_id: str):
+        self.client = client
+        self.collection_id = collection_id
+        self.index: Optional[OwnershipIndex] = None
+        self.follower: Optional[BlockFollower] = None
+        self._owners_body: Optional[bytes] = None
+        self._owners_snapshot = None
+
+    async def build(self):
+        listings = await asyncio.to_thread(
+            lambda: [listing for page in fetch_collection_pages(self.collection_id) for listing in page])
+        state = await self.client.get_blockchain_state()
+        peak = state["peak"]
+        height = peak.height
+
+        excluded = (await load_exclusions(self.client, height)).puzzle_hashes
+        index = OwnershipIndex({listing.nft_id: listing for listing in listings}, excluded)
+        follower = BlockFollower(self.client, index)
+        await follower.resolve([listing.nft_id for listing in listings if listing.nft_id not in EXCLUDED_NFT_SET],
+                               height)
+        index.height = height
+
+        self.index = index
+        self.follower = follower
+        self.follower.header_hashes[height] = peak.header_hash
+        print(f"\nIndexed {len(index.resolutions)} NFTs at height {height}")
+        if follower.pending:
+            print(f"{len(follower.pending)} NFTs could not be resolved, retrying at the next poll")
+
+    async def header_hash(self, height: int) -> bytes32:
+        if height in self.follower.header_hashes:
+            return self.follower.header_hashes[height]
+        block = await self.client.get_block_record_by_height(height)
+        return block.header_hash
+
+    async def handle_owners(self, request: web.Request) -> web.Response:
+        snapshot = self.index.snapshot()
+        if snapshot is not self._owners_snapshot:
+            self._owners_body = json.dumps({
+                "height": self.index.height,
+                "owners": [record.to_dict() for record in snapshot],
+            }).encode()
+            self._owners_snapshot = snapshot
+        return web.Response(body=self._owners_body, content_type="application/json")
+
+    async def handle_holder(self, request: web.Request) -> web.Response:
+        address = request.match_info["address"]
+        try:
+            puzzle_hash = decode_puzzle_hash(address)
+        except ValueError:
+            raise web.HTTPBadRequest(text=f"Invalid address: {address}")
+
+        return web.json_response({
+            "height": self.index.height,
+            "xch_address": address,
+            "eligible": self.index.is_eligible(puzzle_hash),
+            "nfts": [record.to_dict() for record in self.index.holder(puzzle_hash)],
+        })
+
+    async def handle_draw(self, request: web.Request) -> web.Response:
+        try:
+            num_of_winners = int(request.query.get("winners", "1"))
+        except ValueError:
+            raise web.HTTPBadRequest(text="winners must be an integer")
+        sampler = request.query.get("sampler", HASH_SAMPLER)
+        if sampler not in SAMPLERS:
+            raise web.HTTPBadRequest(text=f"sampler must be one of {', '.join(SAMPLERS)}")
+
+        snapshot = self.index.snapshot()
+        if not 0 < num_of_winners <= len(snapshot):
+            raise web.HTTPBadRequest(text=f"winners must be between 1 and {len(snapshot)}")
+
+        height = self.index.height
+        header_hash = await self.header_hash(height)
+        if sampler == LEGACY_SAMPLER:
+            winners = [snapshot[position] for position in legacy_draw_positions(header_hash, len(snapshot),
+                                                                                 num_of_winners)]
+        else:
+            by_id = {record.nft_id: record for record in snapshot}
+            winners = [by_id[nft_id] for _, nft_id in hash_draw(header_hash, by_id, num_of_winners)]
+        return web.json_response({
+            "height": height,
+            "header_hash": header_hash.hex(),
+            "sampler": sampler,
+            "winners": [record.to_dict() for record in winners],
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/owners", self.handle_owners)
+        app.router.add_get("/holder/{address}", self.handle_holder)
+        app.router.add_get("/draw", self.handle_draw)
+        return app
+
+
+async def serve(collection_id: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                rpc_cache: Optional[str] = None, node_db: Optional[str] = None):
+    client = await connect_full_node()
+    if client is None:
+        return
+
+    client = await wrap_node_client(client, rpc_cache, node_db)
+
+    service = HolderService(client, collection_id)
+    runner = None
+    try:
+        print(f"\nIndexing collection {collection_id}...")
+        await service.build()
+
+        runner = web.AppRunner(service.app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        print(f"Serving holders on http://{host}:{port}")
+
+        await service.follower.run()
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        client.close()
+        await client.await_closed()
+
@@ -0,0 +1,128 @@
+import hashlib
+import heapq
+import json
+import os
+import random
+from typing import Dict, Iterable, List, Tuple
+
+from chia.util.bech32m import CHARSET
+
+HASH_SAMPLER = "hash-v1"
+LEGACY_SAMPLER = "legacy"
+SAMPLERS = (HASH_SAMPLER, LEGACY_SAMPLER)
+# Mixed into every rank so the same header hash never ranks NFTs the same way for another purpose
+HASH_SAMPLER_DOMAIN = b"nft-holder-picker/draw/hash-v1"
+# Maps bech32 characters onto base 32 digits, so an id's data part can be read with int(..., 32)
+BECH32_TO_BASE32 = str.maketrans(CHARSET, "0123456789abcdefghijklmnopqrstuv")
+
+
+def legacy_draw_positions(header_hash: bytes, count: int, num_of_winners: int) -> List[int]:
+    """
+    Positions of the winners in the sorted snapshot, in draw order
+    Reproduces seeding random with the header hash and popping random indices off the
+    sorted results list, without needing the list itself. At most count winners are drawn.
+    Args:
+        header_hash: Header hash of the block at the target height
+        count: Number of entries in the snapshot
+        num_of_winners: Number of winners to draw
+    """
+    # Convert bytes32 to an integer for the seed
+    random.seed(int.from_bytes(header_hash, 'big'))
+
+    positions: List[int] = []
+    for _ in range(min(num_of_winners, count)):
+        # Index into the entries that have not been drawn yet
+        index = random.randint(0, count - len(positions) - 1)
+        # Map it back onto the full snapshot by stepping over earlier winners
+        for taken in sorted(positions):
+            if taken > index:
+                break
+            index += 1
+        positions.append(index)
+
+    return positions
+
+
+def launcher_id(nft_id: str) -> bytes:
+    """
+    Launcher id of an nft1... id
+    Same as decode_puzzle_hash, without checking the checksum, which is several times slower
+    and dominates a draw over a large snapshot.
+    """
+    data = nft_id[nft_id.rindex("1") + 1:-6]
+    if len(data) != 52:
+        raise ValueError(f"Invalid NFT id {nft_id}")
+    # 52 characters carry 260 bits: the 32 byte id followed by 4 bits of padding
+    return (int(data.translate(BECH32_TO_BASE32), 32) >> 4).to_bytes(32, "big")
+
+
+def draw_rank(header_hash: bytes, nft_id: str) -> bytes:
+    """Rank of an NFT in a hash-v1 draw, lowest wins: sha256(domain || header hash || launcher id)"""
+    return hashlib.sha256(HASH_SAMPLER_DOMAIN + bytes(header_hash) + launcher_id(nft_id)).digest()
+
+
+def hash_draw(header_hash: bytes, nft_ids: Iterable[str], num_of_winners: int) -> List[Tuple[bytes, str]]:
+    """
+    Winners of a hash-v1 draw as (rank, nft_id), in draw order
+    Every NFT is ranked on its own, so the result does not depend on the order of nft_ids, on
+    sorting or on the Python version, and the draw is a single pass keeping num_of_winners entries.
+    """
+    return heapq.nsmallest(num_of_winners, ((draw_rank(header_hash, nft_id), nft_id) for nft_id in nft_ids))
+
+
+def draw_log_path(path: str) -> str:
+    """Path of the draw log stored next to a snapshot, e.g. nft_results.draw.json"""
+    return f"{os.path.splitext(path)[0]}.draw.json"
+
+
+def snapshot_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_draw_log(snapshot_path: str, header_hash: bytes, count: int, winners: List[Tuple[bytes, str]]):
+    """
+    Record a hash-v1 draw next to its snapshot
+    The log holds everything needed to check the draw: the sampler version, the seed, the
+    snapshot's sha256 and size, and each winner with its rank.
+    """
+    with open(draw_log_path(snapshot_path), "w") as f:
+        json.dump({
+            "sampler": HASH_SAMPLER,
+            "domain": HASH_SAMPLER_DOMAIN.decode(),
+            "header_hash": bytes(header_hash).hex(),
+            "snapshot_sha256": snapshot_digest(snapshot_path),
+            "count": count,
+            "winners": [{"nft_id": nft_id, "rank": rank.hex()} for rank, nft_id in winners],
+        }, f, indent=2)
+
+
+def read_draw_log(snapshot_path: str) -> Dict:
+    with open(draw_log_path(snapshot_path)) as f:
+        return json.load(f)
+
+
+def verify_draw_log(snapshot_path: str, nft_ids: List[str]) -> List[str]:
+    """
+    Check the draw log of a snapshot against the snapshot's NFTs, returning any problems found
+    """
+    log = read_draw_log(snapshot_path)
+    if log["sampler"] != HASH_SAMPLER:
+        return [f"Unsupported sampler {log['sampler']!r}"]
+
+    problems = []
+    if snapshot_digest(snapshot_path) != log["snapshot_sha256"]:
+        problems.append("Snapshot does not match the sha256 recorded in the draw log")
+    if len(nft_ids) != log["count"]:
+        problems.append(f"Snapshot has {len(nft_ids)} entries, the draw log recorded {log['count']}")
+
+    header_hash = bytes.fromhex(log["header_hash"])
+    expected = hash_draw(header_hash, nft_ids, len(log["winners"]))
+    recorded = [(bytes.fromhex(w["rank"]), w["nft_id"]) for w in log["winners"]]
+    for i, (want, got) in enumerate(zip(expected, recorded)):
+        if want != got:
+            problems.append(f"Winner {i + 1} should be {want[1]}, the draw log has {got[1]}")
+    return problems
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import FrozenSet, Iterable, List, Optional, Set
+
+from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.bech32m import decode_puzzle_hash
+from chia.wallet.did_wallet.did_wallet_puzzles import uncurry_innerpuz
+from chia.wallet.singleton import get_inner_puzzle_from_singleton
+from excluded_list import EXCLUDED_ADDRESSES
+from nft import VERIFY_BATCH_SIZE, singleton_child, spent_at
+
+DEFAULT_CONFIG_PATH = "exclusions.json"
+DEFAULT_CACHE_PATH = "excluded_puzzle_hashes.json"
+
+
+@dataclass(slots=True)
+class ExclusionConfig:
+    """
+    Where excluded holders come from
+    addresses: xch addresses excluded as they are
+    dids: did:chia:1... ids; every wallet a DID has been spent from is excluded
+    treasuries: xch addresses whose recipients are excluded, following payouts `depth` hops deep
+    """
+    addresses: List[str] = field(default_factory=list)
+    dids: List[str] = field(default_factory=list)
+    treasuries: List[str] = field(default_factory=list)
+    depth: int = 1
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CONFIG_PATH) -> "ExclusionConfig":
+        """Read the config at path, or exclude the addresses in excluded_list.py if there is none"""
+        if not os.path.exists(path):
+            return cls(list(EXCLUDED_ADDRESSES))
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    def digest(self) -> str:
+        """Identifies the config a cached set was built from, so edits invalidate the cache"""
+        data = json.dumps([sorted(self.addresses), sorted(self.dids), sorted(self.treasuries), self.depth])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def needs_node(self) -> bool:
+        return bool(self.dids or self.treasuries)
+
+
+@dataclass(slots=True)
+class ExclusionSet:
+    """Excluded owner puzzle hashes, with the height they were derived at"""
+    puzzle_hashes: FrozenSet[bytes32]
+    height: int
+    config_digest: str
+
+    def __len__(self) -> int:
+        return len(self.puzzle_hashes)
+
+    def save(self, path: str = DEFAULT_CACHE_PATH):
+        with open(path, "w") as f:
+            json.dump({
+                "height": self.height,
+                "config_digest": self.config_digest,
+                "puzzle_hashes": sorted(ph.hex() for ph in self.puzzle_hashes),
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CACHE_PATH) -> "ExclusionSet":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(frozenset(bytes32.fromhex(ph) for ph in data["puzzle_hashes"]), data["height"],
+                   data["config_digest"])
+
+
+async def did_puzzle_hashes(client: FullNodeRpcClient, did_id: str, height: int) -> Set[bytes32]:
+    """
+    Puzzle hashes of the wallets a DID was spent from up to height
+    Walks the DID singleton from its launcher and reads the p2 puzzle out of every spent DID coin.
+    """
+    puzzle_hashes = set()
+    current_coin = await client.get_coin_record_by_name(decode_puzzle_hash(did_id))
+    if current_coin is None:
+        raise Exception(f"DID {did_id} not found")
+
+    is_launcher = True
+    while spent_at(current_coin, height):
+        spend = await client.get_puzzle_and_solution(current_coin.name, current_coin.spent_block_index)
+        if spend is None:
+            break
+
+        if not is_launcher:
+            inner_puzzle = get_inner_puzzle_from_singleton(spend.puzzle_reveal)
+            did_args = uncurry_innerpuz(inner_puzzle) if inner_puzzle is not None else None
+            if did_args is not None:
+                puzzle_hashes.add(did_args[0].get_tree_hash())
+        is_launcher = False
+
+        child = singleton_child(spend)
+        if child is None:
+            break
+        current_coin = await client.get_coin_record_by_name(child.name())
+        if current_coin is None:
+            break
+
+    return puzzle_hashes
+
+
+async def treasury_recipients(client: FullNodeRpcClient, treasuries: Iterable[bytes32], height: int, depth: int = 1,
+                              batch_size: int = VERIFY_BATCH_SIZE) -> Set[bytes32]:
+    """
+    Puzzle hashes that received coins from the treasuries up to height, following payouts depth hops
+    Each hop queries the coins held at the current puzzle hashes and then the children of the spent
+    ones, both batch_size ids per query.
+    """
+    seen = set(treasuries)
+    frontier = list(seen)
+    recipients = set()
+    for _ in range(depth):
+        if not frontier:
+            break
+
+        spent = []
+        for start in range(0, len(frontier), batch_size):
+            coins = await client.get_coin_records_by_puzzle_hashes(frontier[start:start + batch_size],
+                                                                   include_spent_coins=True, end_height=height + 1)
+            spent.extend(record.name for record in coins if spent_at(record, height))
+
+        frontier = []
+        for start in range(0, len(spent), batch_size):
+            children = await client.get_coin_records_by_parent_ids(spent[start:start + batch_size],
+                                                                   include_spent_coins=True, end_height=height + 1)
+            for child in children:
+                puzzle_hash = child.coin.puzzle_hash
+                if puzzle_hash not in seen:
+                    seen.add(puzzle_hash)
+                    recipients.add(puzzle_hash)
+                    frontier.append(puzzle_hash)
+
+    return recipients
+
+
+async def build_exclusions(client: Optional[FullNodeRpcClient], config: ExclusionConfig, height: int) -> ExclusionSet:
+    """Derive the excluded puzzle hashes for config as of height"""
+    puzzle_hashes = {decode_puzzle_hash(address) for address in config.addresses}
+
+    for did_id in config.dids:
+        found = await did_puzzle_hashes(client, did_id, height)
+        print(f"DID {did_id}: {len(found)} wallets excluded")
+        puzzle_hashes |= found
+
+    if config.treasuries:
+        treasuries = [decode_puzzle_hash(address) for address in config.treasuries]
+        found = await treasury_recipients(client, treasuries, height, config.depth)
+        print(f"Treasuries: {len(found)} recipients excluded")
+        puzzle_hashes |= set(treasuries) | found
+
+    return ExclusionSet(frozenset(puzzle_hashes), height, config.digest())
+
+
+async def load_exclusions(client: Optional[FullNodeRpcClient], height: int, config_path: str = DEFAULT_CONFIG_PATH,
+                          cache_path: str = DEFAULT_CACHE_PATH, rebuild: bool = False) -> ExclusionSet:
+    """
+    The excluded puzzle hashes for the config at config_path, built once and cached at cache_path
+    The cache is reused until the config changes or rebuild is set. Wallets derived from DIDs and
+    treasuries depend on the height, so a set that has them is only reused at the height it was built at.
+    """
+    config = ExclusionConfig.load(config_path)
+    if not rebuild and os.path.exists(cache_path):
+        cached = ExclusionSet.load(cache_path)
+        if cached.config_digest != config.digest():
+            print(f"{config_path} changed since {cache_path} was built, rebuilding it")
+        elif cached.height != height and config.needs_node():
+            print(f"{cache_path} was built at height {cached.height}, rebuilding it at height {height}")
+        else:
+            return cached
+
+    if config.needs_node() and client is None:
+        raise Exception(f"A full node is needed to derive exclusions from DIDs or treasuries in {config_path}")
+
+    exclusions = await build_exclusions(client, config, height)
+    exclusions.save(cache_path)
+    print(f"{len(exclusions)} excluded puzzle hashes at height {height} saved to {cache_path}")
+    return exclusions
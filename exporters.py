@@ -0,0 +1,160 @@
+import csv
+import json
+import os
+import queue
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+EXPORT_FORMATS = ("ndjson", "csv", "parquet")
+SNAPSHOT_COLUMNS = ("position", "nft_id", "name", "xch_address")
+WINNER_COLUMNS = ("winner", "position", "nft_id", "name", "xch_address")
+
+EXPORT_BATCH_SIZE = 10_000  # rows handed to each exporter at a time, and rows per Parquet row group
+EXPORT_QUEUE_DEPTH = 4  # batches buffered per exporter before the producer waits
+
+
+class NDJSONExporter:
+    """One JSON object per line"""
+
+    def __init__(self, path: str, columns: Sequence[str]):
+        self.file = open(path, "w")
+
+    def write_batch(self, rows: List[Dict]):
+        self.file.write("".join(json.dumps(row) + "\n" for row in rows))
+
+    def close(self):
+        self.file.close()
+
+
+class CSVExporter:
+    def __init__(self, path: str, columns: Sequence[str]):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=columns)
+        self.writer.writeheader()
+
+    def write_batch(self, rows: List[Dict]):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetExporter:
+    """Zstd-compressed Parquet, one row group per batch. Needs pyarrow"""
+
+    def __init__(self, path: str, columns: Sequence[str]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Parquet export needs pyarrow (pip install pyarrow)")
+
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([(column, pa.int64() if column in ("position", "winner") else pa.string())
+                                 for column in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write_batch(self, rows: List[Dict]):
+        arrays = {column: [row[column] for row in rows] for column in self.columns}
+        self.writer.write_table(self.pa.Table.from_pydict(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+EXPORTERS = {
+    "ndjson": NDJSONExporter,
+    "csv": CSVExporter,
+    "parquet": ParquetExporter,
+}
+
+
+def export_path(path: str, export_format: str) -> str:
+    """Path of an export next to a snapshot, e.g. nft_results.csv for nft_results.json"""
+    return f"{os.path.splitext(path)[0]}.{export_format}"
+
+
+class ExportPipeline:
+    """
+    Writes the same rows to several formats at once
+    Every exporter runs in its own thread fed through a bounded queue, so encoding and compression
+    for each format overlap with each other and with the producer. Rows are passed in batches.
+    """
+
+    def __init__(self, base_path: str, formats: Iterable[str], columns: Sequence[str],
+                 batch_size: int = EXPORT_BATCH_SIZE):
+        formats = list(formats)
+        self.columns = columns
+        self.batch_size = batch_size
+        self.paths = [export_path(base_path, export_format) for export_format in formats]
+        # Open every file up front so a missing dependency fails before any work is done
+        exporters = [EXPORTERS[export_format](path, columns) for export_format, path in zip(formats, self.paths)]
+        self.queues: List[queue.Queue] = []
+        self.threads: List[threading.Thread] = []
+        self.errors: List[Exception] = []
+        self._batch: List[Dict] = []
+        for exporter in exporters:
+            rows_queue = queue.Queue(EXPORT_QUEUE_DEPTH)
+            thread = threading.Thread(target=self._drain, args=(exporter, rows_queue), daemon=True)
+            thread.start()
+            self.queues.append(rows_queue)
+            self.threads.append(thread)
+
+    def _drain(self, exporter, rows_queue: queue.Queue):
+        try:
+            while (rows := rows_queue.get()) is not None:
+                exporter.write_batch(rows)
+        except Exception as e:
+            self.errors.append(e)
+            # Keep consuming so the producer is never blocked on a failed exporter
+            while rows_queue.get() is not None:
+                pass
+        finally:
+            exporter.close()
+
+    def write(self, row: Dict):
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._batch:
+            for rows_queue in self.queues:
+                rows_queue.put(self._batch)
+            self._batch = []
+
+    def close(self):
+        self._flush()
+        for rows_queue in self.queues:
+            rows_queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            raise Exception(f"Export failed: {self.errors[0]}")
+
+
+def export_rows(base_path: str, formats: Iterable[str], columns: Sequence[str], rows: Iterable[Dict]) -> List[str]:
+    """Write rows to every format, returning the paths written"""
+    pipeline = ExportPipeline(base_path, formats, columns)
+    for row in rows:
+        pipeline.write(row)
+    pipeline.close()
+    return pipeline.paths
+
+
+def winner_rows(positions: Sequence[int], entries: Union[Sequence[Dict], Dict[int, Dict]]) -> Iterator[Dict]:
+    """Rows for the drawn winners, entries being snapshot entries keyed by position"""
+    for i, position in enumerate(positions):
+        yield {"winner": i + 1, "position": position, **entries[position]}
+
+
+def parse_formats(value: Optional[str]) -> List[str]:
+    """Formats from a comma separated --export value"""
+    if not value:
+        return []
+    formats = [f.strip().lower() for f in value.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in EXPORT_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown export format {unknown[0]!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+    return list(dict.fromkeys(formats))
@@ -1,31 +1,49 @@
+from __future__ import annotations
+
+import argparse
 import asyncio
 import json
-import random
-import re
 import sys
 
-import requests
 import time
-from typing import Optional
-from chia.rpc.full_node_rpc_client import FullNodeRpcClient
-from chia.util.config import load_config
-from chia.util.default_root import DEFAULT_ROOT_PATH
-from nft import get_nft_info
-from excluded_list import EXCLUDED_ADDRESSES, EXCLUDED_NFTS
+from typing import (TYPE_CHECKING, AbstractSet, Callable, Dict, Iterable, Iterator, List, Mapping, Optional,
+                    Sequence, Tuple, Union)
+from analytics import WHALE_THRESHOLD, HolderStats, analytics_path
+from metadata_index import MetadataIndex, NFTMetadata, compile_filter
+from records import NFTListing, OwnerRecord, ResolutionError, ResolvedNFT
+from snapshot import read_snapshot, read_snapshot_meta, write_snapshot, write_snapshot_meta
+from sorting import external_sort, parse_edition
+from spill import MemoryBudget, RecordList, budget_from_mib, record_list
+from draw import (HASH_SAMPLER, LEGACY_SAMPLER, SAMPLERS, hash_draw, legacy_draw_positions, verify_draw_log,
+                  write_draw_log)
+from exporters import SNAPSHOT_COLUMNS, WINNER_COLUMNS, ExportPipeline, export_rows, parse_formats, winner_rows
+from excluded_list import EXCLUDED_NFTS
+
+# The chia RPC and wallet stacks, requests and aiohttp take most of the startup time, so they are
+# imported inside the functions that talk to the node or MintGarden. Paths that only work from
+# files on disk never load them (see benchmarks/import_time.py).
+if TYPE_CHECKING:
+    from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+    from chia.types.blockchain_format.sized_bytes import bytes32
+    from timeline import OwnershipTimeline
 
 MINTGARDEN_API = "https://api.mintgarden.io"
 RATE_LIMIT_DELAY = 1  # seconds between API calls
-TOTAL_PROCESSED = 0
+COLLECTION_LIMIT = 250  # NFTs a scan lists before it stops, checked per page
+
+COMMANDS = ("scan", "draw", "serve", "exclusions", "export")
+
+EXCLUDED_NFT_SET = frozenset(EXCLUDED_NFTS)
+WINNERS_BASE = "nft_winners"  # exports of the draw, e.g. nft_winners.csv
+
 
-async def get_and_process_collection_nfts(client: FullNodeRpcClient, collection_id: str, target_height: Optional[int] = None):
+def fetch_collection_items(collection_id: str) -> Iterator[List[Dict]]:
     """
-    Fetch and process NFTs from a collection using MintGarden API
+    Yield pages of raw NFT items for a collection from the MintGarden API
     Args:
-        client: FullNodeRpcClient
         collection_id: The collection ID from MintGarden
-        target_height: Optional target block height
     """
-    global TOTAL_PROCESSED
+    import requests
 
     endpoint = f"{MINTGARDEN_API}/collections/{collection_id}/nfts"
     params = {
@@ -33,11 +51,8 @@ async def get_and_process_collection_nfts(client: FullNodeRpcClient, collection_
     }
 
     page = 1
-    results = []
-    seen_nfts = []
-
     try:
-        while TOTAL_PROCESSED < 250:
+        while True:
             print(f"\rFetching page {page}...", end="")
             response = requests.get(endpoint, params=params)
 
@@ -50,58 +65,12 @@ async def get_and_process_collection_nfts(client: FullNodeRpcClient, collection_
             response.raise_for_status()
             data = response.json()
 
-            nfts = data.get("items", [])
-
-            # Process each NFT in the current batch
-            for nft_record in nfts:
-                nft_id = nft_record["encoded_id"]
-                TOTAL_PROCESSED += 1
-                if nft_id in seen_nfts:
-                    print(f"Already processed {nft_id}")
-                seen_nfts.append(nft_id)
-
-                if nft_id in EXCLUDED_NFTS:
-                    print(f"{nft_id} is excluded")
-                    continue
-
-                print(f"\nProcessing NFT {TOTAL_PROCESSED}: {nft_id}")
-                try:
-                    nft_info = await get_nft_info(client, nft_id, target_height)
-                    print(nft_info)
-                    if isinstance(nft_info, str):
-                        nft_info = json.loads(nft_info)
-
-                    if nft_info and isinstance(nft_info, dict) and "current_address" in nft_info:
-                        xch_address = nft_info["current_address"]
-
-                        # Skip excluded addresses
-                        if xch_address in EXCLUDED_ADDRESSES:
-                            continue
-
-                        owner_info = {
-                            "nft_id": nft_id,
-                            "name": nft_record["name"],
-                            "xch_address": xch_address,
-                        }
-                        print(f"Current owner: {xch_address}")
-                        results.append(owner_info)
-                    else:
-                        print(f"No owner information found for NFT")
-                        results.append({
-                            "nft_id": nft_id,
-                            "error": "No owner information found"
-                        })
-                except Exception as e:
-                    print(f"Failed to process NFT: {str(e)}")
-                    results.append({
-                        "nft_id": nft_id,
-                        "error": str(e)
-                    })
+            yield data.get("items", [])
 
             # Check if there are more pages
             next_cursor = data.get("next")
             if not next_cursor or next_cursor == ">":
-                break
+                return
 
             # Update params for next page
             params["page"] = next_cursor
@@ -110,58 +79,614 @@ async def get_and_process_collection_nfts(client: FullNodeRpcClient, collection_
             # Add delay between pages
             time.sleep(RATE_LIMIT_DELAY)
 
-        print(f"\nCompleted processing all NFTs: {TOTAL_PROCESSED} total")
-        return results
-
     except requests.exceptions.RequestException as e:
         raise Exception(f"Failed to fetch collection NFTs: {str(e)}")
 
-async def main():
+
+def listing_from_item(item: Dict) -> NFTListing:
+    return NFTListing(item["encoded_id"], item["name"], parse_edition(item["name"], item.get("edition_number")))
+
+
+def fetch_collection_pages(collection_id: str) -> Iterator[List[NFTListing]]:
+    """
+    Yield pages of NFT listings for a collection from the MintGarden API
+    Args:
+        collection_id: The collection ID from MintGarden
+    """
+    for items in fetch_collection_items(collection_id):
+        yield [listing_from_item(item) for item in items]
+
+
+def eligible_listings(items: Iterable[Dict], listings_by_id: Dict[str, NFTListing],
+                      metadata: Optional[MetadataIndex] = None,
+                      eligible: Optional[Callable[[NFTMetadata], bool]] = None) -> List[NFTListing]:
+    """
+    Listings of a page of collection items that are to be resolved
+    Every item is added to listings_by_id and metadata; excluded NFTs, NFTs the filter rejects
+    and NFTs already in listings_by_id are left out.
+    """
+    batch = []
+    for item in items:
+        listing = listing_from_item(item)
+        nft_id = listing.nft_id
+        if nft_id in listings_by_id:
+            print(f"Already processed {nft_id}")
+            continue
+        listings_by_id[nft_id] = listing
+        nft_metadata = NFTMetadata.from_item(item)
+        matches = eligible is None or eligible(nft_metadata)
+        if metadata is not None:
+            metadata.add(nft_metadata)
+            if eligible is not None and matches:
+                metadata.matched += 1
+
+        if nft_id in EXCLUDED_NFT_SET:
+            print(f"{nft_id} is excluded")
+            continue
+        if not matches:
+            print(f"{nft_id} does not match the filter")
+            continue
+        batch.append(listing)
+
+    return batch
+
+
+def eligible_batches(collection_id: str, listings_by_id: Dict[str, NFTListing], metadata: MetadataIndex,
+                     eligible: Optional[Callable[[NFTMetadata], bool]] = None,
+                     limit: Optional[int] = COLLECTION_LIMIT) -> Iterator[List[str]]:
+    """
+    Yield, page by page, the ids of the collection's NFTs that are to be resolved
+    Every listed NFT is added to listings_by_id and metadata, see eligible_listings. Listing stops
+    once limit NFTs have been listed, checked per page; None lists the whole collection.
+    """
+    listed = 0
+    for items in fetch_collection_items(collection_id):
+        if limit is not None and listed >= limit:
+            break
+
+        listed += len(items)
+        yield [listing.nft_id for listing in eligible_listings(items, listings_by_id, metadata, eligible)]
+
+
+async def get_and_process_collection_nfts(client: FullNodeRpcClient, collection_id: str, target_height: int,
+                                          concurrency: int = 20, nft_timeout: float = 300,
+                                          eligible: Optional[Callable[[NFTMetadata], bool]] = None,
+                                          metadata: Optional[MetadataIndex] = None,
+                                          excluded: Optional[AbstractSet[bytes32]] = None,
+                                          held_since: Optional[int] = None,
+                                          timelines: Optional[Dict[str, OwnershipTimeline]] = None,
+                                          memory_budget: Optional[MemoryBudget] = None,
+                                          stats: Optional[HolderStats] = None
+                                          ) -> Tuple[RecordList[OwnerRecord], List[ResolutionError]]:
+    """
+    Fetch and process NFTs from a collection using MintGarden API
+    Args:
+        client: FullNodeRpcClient
+        collection_id: The collection ID from MintGarden
+        target_height: Block height ownership is resolved at
+        concurrency: Number of NFTs resolved at the same time
+        nft_timeout: Seconds allowed for a single NFT before it is queued for a retry
+        eligible: Metadata filter; NFTs it rejects are skipped before any node lookup
+        metadata: Index that every listed NFT's metadata is added to
+        excluded: Owner puzzle hashes that are not eligible, defaults to the cached exclusion set
+        held_since: Only owners that have held the NFT without interruption since this height are eligible
+        timelines: Filled with the ownership timeline of every resolved NFT, up to target_height
+        memory_budget: Process memory past which owner records are spilled to disk
+        stats: Holder statistics the NFTs held by excluded owners are counted in
+    Returns:
+        The eligible owner records and the NFTs that could not be resolved
+    """
+    listings_by_id: Dict[str, NFTListing] = {}
+    if metadata is None:
+        metadata = MetadataIndex()
+    if excluded is None:
+        from exclusions import load_exclusions
+
+        excluded = (await load_exclusions(client, target_height)).puzzle_hashes
+
+    batches = eligible_batches(collection_id, listings_by_id, metadata, eligible)
+    return await resolve_batches(client, batches, listings_by_id, target_height, concurrency, nft_timeout,
+                                 excluded, held_since, timelines, memory_budget, stats)
+
+
+async def resolve_batches(client: FullNodeRpcClient, batches: Iterable[List[str]],
+                          listings_by_id: Dict[str, NFTListing], target_height: int, concurrency: int = 20,
+                          nft_timeout: float = 300, excluded: AbstractSet[bytes32] = frozenset(),
+                          held_since: Optional[int] = None,
+                          timelines: Optional[Dict[str, OwnershipTimeline]] = None,
+                          memory_budget: Optional[MemoryBudget] = None,
+                          stats: Optional[HolderStats] = None
+                          ) -> Tuple[RecordList[OwnerRecord], List[ResolutionError]]:
+    """
+    Resolve the owners of batches of NFTs, retrying failures and verifying the results at the end
+    Args:
+        client: FullNodeRpcClient
+        batches: Lists of NFT ids, each resolved concurrently
+        listings_by_id: Name and edition of every NFT in batches
+        target_height: Block height ownership is resolved at
+        concurrency: Number of NFTs resolved at the same time
+        nft_timeout: Seconds allowed for a single NFT before it is queued for a retry
+        excluded: Owner puzzle hashes that are not eligible
+        held_since: Only owners that have held the NFT without interruption since this height are eligible
+        timelines: Filled with the ownership timeline of every resolved NFT, up to target_height
+        memory_budget: Process memory past which owner records are spilled to disk; without one they
+            are kept in lists
+        stats: Holder statistics the NFTs held by excluded owners are counted in, as they are not
+            part of the results
+    Returns:
+        The eligible owner records, a SpillList under a budget, and the NFTs that could not be resolved
+    """
+    from resolver import OwnerResolver
+
+    results: RecordList[OwnerRecord] = record_list(memory_budget)
+    resolutions: RecordList[ResolvedNFT] = record_list(memory_budget)
+    resolver = OwnerResolver(client, listings_by_id, target_height, concurrency, nft_timeout, excluded, held_since,
+                             timelines, stats)
+
+    processed = 0
+
+    def record(owners: List[Tuple[OwnerRecord, ResolvedNFT]]):
+        for owner, resolution in owners:
+            results.append(owner)
+            resolutions.append(resolution)
+
+    for batch in batches:
+        # Resolve the current batch concurrently
+        processed += len(batch)
+        print(f"\nProcessing {len(batch)} NFTs ({processed} total)")
+        record(await resolver.resolve(batch))
+
+    # NFTs that failed get one more attempt once everything else is done
+    record(await resolver.retry())
+
+    print(f"\nCompleted processing all NFTs: {processed} total")
+
+    # Confirm every reported coin was unspent at the target height with bulk coin record queries
+    failed = await resolver.verify(resolutions)
+    if failed:
+        print(f"{len(failed)} NFTs failed verification at height {target_height}")
+        verified = record_list(memory_budget)
+        verified.extend(r for r in results if r.nft_id not in failed)
+        results = verified
+
+    return results, resolver.errors
+
+
+async def connect_full_node() -> Optional[FullNodeRpcClient]:
+    """
+    Create an RPC client for the local full node, or None if Chia is not initialized
+    """
+    from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+    from chia.util.config import load_config
+    from chia.util.default_root import DEFAULT_ROOT_PATH
+
+    # Check if Chia config exists
     try:
-        # Check if Chia config exists
-        try:
-            config = load_config(DEFAULT_ROOT_PATH, "config.yaml")
-        except Exception as e:
-            print("Error: Chia configuration not found. Is Chia installed and initialized?")
+        config = load_config(DEFAULT_ROOT_PATH, "config.yaml")
+    except Exception as e:
+        print("Error: Chia configuration not found. Is Chia installed and initialized?")
+        return None
+
+    try:
+        return await FullNodeRpcClient.create(config["self_hostname"], config["full_node"]["rpc_port"],
+                                              DEFAULT_ROOT_PATH, config)
+    except Exception as e:
+        raise Exception(f"Failed to create RPC client: {e}")
+
+
+async def wrap_node_client(client: FullNodeRpcClient, rpc_cache: Optional[str] = None,
+                           node_db: Optional[str] = None) -> FullNodeRpcClient:
+    """
+    Layer the resolver's client wrappers over a node client
+    From the outside in: the persistent response store (if rpc_cache is set), coalescing of identical
+    in-flight calls, coin record queries against the node's database (if node_db is set, "auto" to
+    find it from the Chia config), and per-call timeouts with retries.
+    """
+    from coalesce import SingleFlightFullNodeClient
+    from resolver import RetryingFullNodeClient
+
+    client = RetryingFullNodeClient(client)
+    if node_db:
+        from node_db import SQLiteFullNodeClient, default_node_database_path
+
+        path = default_node_database_path() if node_db == "auto" else node_db
+        print(f"Reading coin records from {path}")
+        client = SQLiteFullNodeClient(client, path)
+    client = SingleFlightFullNodeClient(client)
+    if rpc_cache:
+        from rpc_store import open_caching_client
+
+        client = await open_caching_client(client, rpc_cache)
+    return client
+
+
+def print_node_client_stats(client: FullNodeRpcClient):
+    if hasattr(client, "store"):
+        print(f"RPC cache: {client.store.hits} hits, {client.store.misses} misses")
+    if hasattr(client, "coalesced"):
+        print(f"Node calls: {client.calls} sent, {client.coalesced} merged into identical in-flight calls")
+    if hasattr(client, "queries"):
+        print(f"Node database: {client.queries} coin record queries")
+
+
+async def scan(collection_id: str, target_height: int, num_of_winners: int, rpc_cache: Optional[str] = None,
+               concurrency: int = 20, nft_timeout: float = 300, eligibility_filter: Optional[str] = None,
+               export_formats: Sequence[str] = (), sampler: str = HASH_SAMPLER, node_db: Optional[str] = None,
+               held_since: Optional[int] = None, also_at: Sequence[int] = (), shards: int = 1,
+               memory_budget: Optional[int] = None, whale_threshold: int = WHALE_THRESHOLD):
+    try:
+        # Reject a malformed filter or heights before connecting to anything
+        eligible = compile_filter(eligibility_filter) if eligibility_filter else None
+        if any(height > target_height for height in also_at) or (held_since or 0) > target_height:
+            raise Exception(f"--also-at and --held-since heights must be at or below {target_height}")
+        if shards < 1:
+            raise Exception("--shards must be at least 1")
+        budget = budget_from_mib(memory_budget)
+
+        client = await connect_full_node()
+        if client is None:
             return
 
-        try:
-            client = await FullNodeRpcClient.create(config["self_hostname"], config["full_node"]["rpc_port"],
-                                                DEFAULT_ROOT_PATH, config)
-        except Exception as e:
-            raise Exception(f"Failed to create RPC client: {e}")
+        client = await wrap_node_client(client, rpc_cache, node_db)
 
-        collection_id = sys.argv[1]
-        target_height = int(sys.argv[2])
-        num_of_winners = int(sys.argv[3])
+        from exclusions import load_exclusions
+
+        excluded = (await load_exclusions(client, target_height)).puzzle_hashes
+        timelines = {} if also_at else None
+        output_file = "nft_results.json"
 
         print(f"\nFetching NFTs from collection {collection_id} before height {target_height}...")
-        results = await get_and_process_collection_nfts(client, collection_id, target_height)
-        results.sort(key=lambda x: int(re.search(r'\d+', x["name"]).group()), reverse=False)
+        metadata = MetadataIndex()
+        stats = HolderStats(whale_threshold)
+        if shards > 1:
+            from sharding import scan_shards
 
-        # Save results to file
-        output_file = "nft_results.json"
-        with open(output_file, "w") as f:
-            json.dump(results, f, indent=2)
-        print(f"\nResults saved to {output_file}")
+            results, errors, holders = await scan_shards(collection_id, target_height, shards, output_file, metadata,
+                                                         excluded, eligible, concurrency, nft_timeout, rpc_cache,
+                                                         node_db, held_since, also_at, memory_budget, stats)
+        else:
+            results, errors = await get_and_process_collection_nfts(client, collection_id, target_height,
+                                                                    concurrency, nft_timeout, eligible, metadata,
+                                                                    excluded, held_since, timelines, budget, stats)
+            holders = None
+        if eligible is not None:
+            print(f"{metadata.matched} of {len(metadata.entries)} NFTs match the filter")
+
+        if errors:
+            errors_file = "nft_errors.json"
+            with open(errors_file, "w") as f:
+                json.dump([e.to_dict() for e in errors], f, indent=2)
+            print(f"{len(errors)} NFTs could not be resolved, see {errors_file}")
 
         # Get the header hash of the cutoff block
         final_block = await client.get_block_record_by_height(target_height)
+        count = len(results)
+        if num_of_winners > count:
+            print(f"Only {count} eligible NFTs, drawing {count} winners")
+        if sampler == LEGACY_SAMPLER:
+            winner_positions = legacy_draw_positions(final_block.header_hash, count, num_of_winners)
+            drawn = []
+        else:
+            # Ranks do not depend on order, so the draw can run before the results are sorted
+            drawn = hash_draw(final_block.header_hash, (record.nft_id for record in results), num_of_winners)
+            winner_positions = []
+
+        # Save results to file in edition order, picking out the winners as they stream past
+        pipeline = ExportPipeline(output_file, export_formats, SNAPSHOT_COLUMNS) if export_formats else None
+        winners = write_snapshot(output_file, external_sort(results), set(winner_positions), pipeline,
+                                 {nft_id for _, nft_id in drawn}, stats)
+        write_snapshot_meta(output_file, collection_id, target_height, final_block.header_hash, count, sampler)
+        if drawn:
+            positions = {record.nft_id: position for position, record in winners.items()}
+            winner_positions = [positions[nft_id] for _, nft_id in drawn]
+            write_draw_log(output_file, final_block.header_hash, count, drawn)
+        print(f"\nResults saved to {output_file}")
+        print_holder_stats(stats.write(output_file))
+        print(f"Holder statistics saved to {analytics_path(output_file)}")
+        if pipeline is not None:
+            pipeline.close()
+            print(f"Exported to {', '.join(pipeline.paths)}")
+
+        for i, position in enumerate(winner_positions):
+            print(f"Winner {i + 1}: {winners[position].to_dict()}")
+        if export_formats:
+            entries = {position: record.to_dict() for position, record in winners.items()}
+            paths = export_rows(WINNERS_BASE, export_formats, WINNER_COLUMNS, winner_rows(winner_positions, entries))
+            print(f"Winners exported to {', '.join(paths)}")
+
+        # Holders at earlier heights come from the timelines walked for the target height
+        for height in also_at:
+            path = f"nft_results_at_{height}.json"
+            records = holders[height] if holders is not None else holders_at(timelines, metadata.entries, excluded,
+                                                                               height)
+            write_snapshot(path, external_sort(records))
+            print(f"Holders at height {height} saved to {path}")
+
+        print_node_client_stats(client)
+        client.close()
+
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+
+def print_holder_stats(report: Dict):
+    whales = report["whales"]
+    excluded = report["excluded"]
+    print(f"Holders: {report['unique_holders']} unique, {report['mean_per_holder']:.2f} NFTs each on average, "
+          f"Gini {report['gini']:.3f}")
+    print(f"Top {len(report['top_holders'])} holders hold {report['top_holders_share']:.1%}, "
+          f"{whales['holders']} holders of {whales['threshold']}+ NFTs hold {whales['share']:.1%}")
+    print(f"Excluded wallets hold {excluded['nfts']} NFTs ({excluded['share']:.1%})")
+
+
+def holders_at(timelines: Dict[str, OwnershipTimeline], listings: Mapping[str, Union[NFTListing, NFTMetadata]],
+               excluded: AbstractSet[bytes32], height: int) -> List[OwnerRecord]:
+    """Eligible owner records at height, read from already walked timelines, named from listings"""
+    records = []
+    for nft_id, timeline in timelines.items():
+        owner = timeline.owner_at(height)
+        if owner is not None and owner not in excluded:
+            listing = listings[nft_id]
+            records.append(OwnerRecord(nft_id, listing.name, owner, listing.edition))
+    return records
+
+
+def redraw(snapshot_file: str, num_of_winners: int, header_hash: Optional[str] = None,
+           export_formats: Sequence[str] = (), sampler: Optional[str] = None):
+    """
+    Re-draw the winners of an earlier scan from its snapshot, without a node
+    Args:
+        snapshot_file: Snapshot written by a scan, e.g. nft_results.json
+        num_of_winners: Number of winners to draw
+        header_hash: Header hash of the target height, defaults to the one recorded with the snapshot
+        export_formats: Formats the winners are also written in, e.g. csv
+        sampler: hash-v1 or legacy, defaults to the one the snapshot was drawn with
+    """
+    entries = read_snapshot(snapshot_file)
+    try:
+        meta = read_snapshot_meta(snapshot_file)
+    except FileNotFoundError:
+        meta = None
+
+    if header_hash is None:
+        if meta is None:
+            raise Exception(f"No header hash recorded for {snapshot_file}, pass --header-hash")
+        header_hash = meta["header_hash"]
+        print(f"Using header hash of height {meta['target_height']}: {header_hash}")
+    if sampler is None:
+        # Snapshots from before samplers were recorded were drawn with the legacy sampler
+        sampler = meta.get("sampler", LEGACY_SAMPLER) if meta is not None else HASH_SAMPLER
+
+    seed = bytes.fromhex(header_hash.removeprefix("0x"))
+    if num_of_winners > len(entries):
+        print(f"Only {len(entries)} eligible NFTs, drawing {len(entries)} winners")
+    if sampler == LEGACY_SAMPLER:
+        winner_positions = legacy_draw_positions(seed, len(entries), num_of_winners)
+    else:
+        positions = {entry["nft_id"]: position for position, entry in enumerate(entries)}
+        winner_positions = [positions[nft_id] for _, nft_id in hash_draw(seed, positions, num_of_winners)]
+    for i, position in enumerate(winner_positions):
+        print(f"Winner {i + 1}: {entries[position]}")
+    if export_formats:
+        paths = export_rows(WINNERS_BASE, export_formats, WINNER_COLUMNS, winner_rows(winner_positions, entries))
+        print(f"Winners exported to {', '.join(paths)}")
 
-        # Convert bytes32 to an integer for the seed
-        int_seed = int.from_bytes(final_block.header_hash, 'big')
-        # Set the seed
-        random.seed(int_seed)
-        for i in range(num_of_winners):
-            # Generate a random integer
-            random_integer = random.randint(0, len(results)-1)  # Random integer between 0 and length of results (minus one, since index starts at 0)
-            winner = results.pop(random_integer)
-            print(f"Winner {i + 1}: {winner}")
 
+def verify_draw(snapshot_file: str) -> bool:
+    """Check the draw log written by a hash-v1 scan against its snapshot"""
+    problems = verify_draw_log(snapshot_file, [entry["nft_id"] for entry in read_snapshot(snapshot_file)])
+    for problem in problems:
+        print(problem)
+    if not problems:
+        print(f"Draw log matches {snapshot_file}")
+    return not problems
+
+
+def export_snapshot(snapshot_file: str, export_formats: Sequence[str]):
+    """Convert a snapshot written by a scan to other formats, e.g. nft_results.json to nft_results.parquet"""
+    rows = ({"position": position, **entry} for position, entry in enumerate(read_snapshot(snapshot_file)))
+    paths = export_rows(snapshot_file, export_formats, SNAPSHOT_COLUMNS, rows)
+    print(f"Exported to {', '.join(paths)}")
+
+
+async def rebuild_exclusions(config_path: str, cache_path: str, height: Optional[int] = None):
+    """
+    Derive the excluded puzzle hashes from the exclusion config and cache them for later runs
+    Args:
+        config_path: Exclusion config, e.g. exclusions.json
+        cache_path: File the derived set is written to
+        height: Block height the set is derived at, defaults to the peak
+    """
+    from exclusions import load_exclusions
+
+    try:
+        client = await connect_full_node()
+        if client is None:
+            return
+
+        if height is None:
+            height = (await client.get_blockchain_state())["peak"].height
+        await load_exclusions(client, height, config_path, cache_path, rebuild=True)
         client.close()
 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
 
+
+def run_scan(args: argparse.Namespace):
+    def run():
+        asyncio.run(scan(args.collection_id, args.target_height, args.num_of_winners, args.rpc_cache,
+                         args.concurrency, args.nft_timeout, args.filter, args.export, args.sampler,
+                         args.node_db, args.held_since, args.also_at, args.shards, args.memory_budget,
+                         args.whale_threshold))
+
+    if args.profile is None:
+        run()
+        return
+
+    from profiling import Profiler
+
+    try:
+        with Profiler(args.profile, args.profiler):
+            run()
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+
+def run_draw(args: argparse.Namespace):
+    try:
+        if args.verify:
+            if not verify_draw(args.snapshot):
+                sys.exit(1)
+            return
+        if args.num_of_winners is None:
+            raise Exception("num_of_winners is required unless --verify is given")
+        redraw(args.snapshot, args.num_of_winners, args.header_hash, args.export, args.sampler)
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        sys.exit(1)
+
+
+def run_export(args: argparse.Namespace):
+    try:
+        export_snapshot(args.snapshot, args.formats)
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        sys.exit(1)
+
+
+def run_serve(args: argparse.Namespace):
+    from daemon import serve
+
+    asyncio.run(serve(args.collection_id, port=args.port, rpc_cache=args.rpc_cache, node_db=args.node_db))
+
+
+def run_exclusions(args: argparse.Namespace):
+    asyncio.run(rebuild_exclusions(args.config, args.cache, args.height))
+
+
+def heights(value: str) -> List[int]:
+    try:
+        return sorted({int(height) for height in value.split(",") if height.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma separated block heights, got {value!r}")
+
+
+def export_formats(value: str) -> List[str]:
+    try:
+        return parse_formats(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def add_export_argument(parser: argparse.ArgumentParser, what: str):
+    parser.add_argument("--export", type=export_formats, default=[],
+                        help=f"also write {what} as any of ndjson, csv, parquet, comma separated")
+
+
+def add_node_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--node-db", nargs="?", const="auto", metavar="PATH",
+                        help="read coin records straight from the full node's blockchain database, read-only; "
+                             "without PATH the database is found from the Chia config")
+    add_rpc_cache_arguments(parser)
+
+
+def add_rpc_cache_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--rpc-cache", default="rpc_cache.sqlite",
+                        help="file that keeps historical node responses between runs (default: rpc_cache.sqlite)")
+    parser.add_argument("--no-rpc-cache", dest="rpc_cache", action="store_const", const=None,
+                        help="always query the node")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Pick winners at random from the holders of an NFT collection")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = subparsers.add_parser("scan", help="resolve holders at a height and draw winners (default)")
+    scan_parser.add_argument("collection_id", help="MintGarden collection id (col1...)")
+    scan_parser.add_argument("target_height", type=int, help="block height ownership is resolved at")
+    scan_parser.add_argument("num_of_winners", type=int, help="number of winners to draw")
+    scan_parser.add_argument("--concurrency", type=int, default=20,
+                             help="NFTs resolved at the same time (default: 20)")
+    scan_parser.add_argument("--nft-timeout", type=float, default=300,
+                             help="seconds allowed per NFT before it is retried at the end of the run (default: 300)")
+    scan_parser.add_argument("--filter", help="only NFTs whose metadata matches are eligible, "
+                                              "e.g. 'trait.background = gold and edition <= 100'")
+    scan_parser.add_argument("--sampler", choices=SAMPLERS, default=HASH_SAMPLER,
+                             help="hash-v1 ranks every NFT by sha256 of the header hash and its launcher id; "
+                                  "legacy seeds Python's random with the header hash (default: hash-v1)")
+    scan_parser.add_argument("--held-since", type=int, metavar="HEIGHT",
+                             help="only owners that have held their NFT without interruption since HEIGHT are eligible")
+    scan_parser.add_argument("--also-at", type=heights, default=[], metavar="HEIGHTS",
+                             help="also save eligible holders at these earlier heights, comma separated, "
+                                  "to nft_results_at_<height>.json, without more node calls")
+    scan_parser.add_argument("--shards", type=int, default=1, metavar="N",
+                             help="resolve the collection in N worker processes, each with its own node "
+                                  "connection, and merge their results (default: 1)")
+    scan_parser.add_argument("--memory-budget", type=int, metavar="MIB",
+                             help="once the process uses more than MIB of memory, keep owner records in "
+                                  "temporary files instead (per worker with --shards)")
+    scan_parser.add_argument("--whale-threshold", type=int, default=WHALE_THRESHOLD, metavar="N",
+                             help="holders of at least N NFTs are counted as whales in the holder statistics "
+                                  f"(default: {WHALE_THRESHOLD})")
+    add_export_argument(scan_parser, "the snapshot and winners")
+    scan_parser.add_argument("--profile", nargs="?", const="profile", metavar="PREFIX",
+                             help="profile the run, writing PREFIX.pstats and PREFIX.collapsed (default: profile)")
+    scan_parser.add_argument("--profiler", choices=("cprofile", "yappi"), default="cprofile",
+                             help="deterministic profiler used with --profile; yappi follows coroutines "
+                                  "and needs pip install yappi (default: cprofile)")
+    add_node_arguments(scan_parser)
+    scan_parser.set_defaults(func=run_scan)
+
+    draw_parser = subparsers.add_parser("draw", help="re-draw winners from a saved snapshot without a node")
+    draw_parser.add_argument("num_of_winners", type=int, nargs="?",
+                             help="number of winners to draw")
+    draw_parser.add_argument("--snapshot", default="nft_results.json",
+                             help="snapshot written by scan (default: nft_results.json)")
+    draw_parser.add_argument("--header-hash", help="header hash of the target height, "
+                                                   "defaults to the one recorded next to the snapshot")
+    draw_parser.add_argument("--sampler", choices=SAMPLERS,
+                             help="sampler to draw with (default: the one the snapshot was drawn with)")
+    draw_parser.add_argument("--verify", action="store_true",
+                             help="check the draw log written by scan against the snapshot instead of drawing")
+    add_export_argument(draw_parser, "the winners")
+    draw_parser.set_defaults(func=run_draw)
+
+    export_parser = subparsers.add_parser("export", help="convert a saved snapshot to other formats")
+    export_parser.add_argument("formats", type=export_formats, help="any of ndjson, csv, parquet, comma separated")
+    export_parser.add_argument("--snapshot", default="nft_results.json",
+                               help="snapshot written by scan (default: nft_results.json)")
+    export_parser.set_defaults(func=run_export)
+
+    serve_parser = subparsers.add_parser("serve", help="keep holders indexed and serve them over HTTP")
+    serve_parser.add_argument("collection_id", help="MintGarden collection id (col1...)")
+    serve_parser.add_argument("--port", type=int, default=8650, help="port to listen on (default: 8650)")
+    add_node_arguments(serve_parser)
+    serve_parser.set_defaults(func=run_serve)
+
+    exclusions_parser = subparsers.add_parser("exclusions", help="rebuild the cached set of excluded holders")
+    exclusions_parser.add_argument("--config", default="exclusions.json",
+                                   help="addresses, DIDs and treasuries to exclude (default: exclusions.json, "
+                                        "or the addresses in excluded_list.py if it does not exist)")
+    exclusions_parser.add_argument("--cache", default="excluded_puzzle_hashes.json",
+                                   help="file the excluded puzzle hashes are cached in "
+                                        "(default: excluded_puzzle_hashes.json)")
+    exclusions_parser.add_argument("--height", type=int, help="block height to derive exclusions at (default: peak)")
+    exclusions_parser.set_defaults(func=run_exclusions)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = build_parser()
+    argv = sys.argv[1:] if argv is None else argv
+    # Keep the original `find_owners.py <collection_id> <target_height> <num_of_winners>` form working
+    if argv and not argv[0].startswith("-") and argv[0] not in COMMANDS:
+        argv = ["scan"] + argv
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
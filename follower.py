@@ -0,0 +1,140 @@
+import asyncio
+from typing import Dict, Iterable, List, Set, Tuple
+
+from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+from chia.types.blockchain_format.sized_bytes import bytes32
+from nft import advance_resolution, resolve_nft_at_height
+from ownership import OwnershipIndex
+from records import ResolvedNFT
+from resolver import OwnerResolver
+
+POLL_INTERVAL = 10  # seconds between peak checks
+BLOCK_BATCH_SIZE = 100  # block records fetched per get_block_records call
+REORG_DEPTH = 100  # heights of header hashes kept to detect reorgs
+
+
+class BlockFollower:
+    """
+    Keeps an OwnershipIndex at the node's peak
+    Polls the peak, fetches new block records in batches and, for each transaction block,
+    advances only the NFTs whose tracked coin was removed in it. Header hashes of recent
+    blocks are kept so a reorg rolls the affected NFTs back to the fork point before the
+    new chain is replayed. NFTs that could not be resolved are tried again on every poll.
+    """
+
+    def __init__(self, client: FullNodeRpcClient, index: OwnershipIndex, poll_interval: float = POLL_INTERVAL):
+        self.client = client
+        self.index = index
+        self.poll_interval = poll_interval
+        self.header_hashes: Dict[int, bytes32] = {}
+        # NFTs changed at each recent height, for rolling back on reorg
+        self.changes: Dict[int, Set[str]] = {}
+        # NFTs without a verified resolution in the index
+        self.pending: Set[str] = set()
+
+    async def run(self):
+        while True:
+            try:
+                await self.catch_up()
+            except Exception as e:
+                print(f"Failed to follow chain: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def resolve(self, nft_ids: Iterable[str], height: int):
+        """
+        Resolve NFTs at height into the index, with the retries and verification of a scan
+        NFTs that still fail, or whose coin fails verification, are kept in pending for the next poll.
+        """
+        nft_ids = list(nft_ids)
+        resolutions: Dict[str, ResolvedNFT] = {}
+        resolver = OwnerResolver(self.client, self.index.listings, height, resolutions=resolutions)
+        await resolver.resolve(nft_ids)
+        await resolver.retry()
+        failed = await resolver.verify(resolutions.values())
+
+        for nft_id in nft_ids:
+            resolution = resolutions.get(nft_id)
+            if resolution is None or nft_id in failed:
+                self.pending.add(nft_id)
+            else:
+                self.pending.discard(nft_id)
+                self.index.update(resolution)
+        for error in resolver.errors:
+            if error.nft_id in self.pending:
+                print(f"Failed to process NFT {error.nft_id}, will retry at the next poll: {error.error}")
+
+    async def catch_up(self):
+        """Retry the pending NFTs, then apply every block between the index height and the current peak"""
+        if self.pending:
+            await self.resolve(self.pending, self.index.height)
+
+        state = await self.client.get_blockchain_state()
+        peak = state["peak"].height
+
+        while self.index.height < peak:
+            start = self.index.height + 1
+            blocks = await self.block_range(start, min(start + BLOCK_BATCH_SIZE, peak + 1))
+            if not blocks:
+                return
+
+            for height, header_hash, prev_hash, is_transaction_block in blocks:
+                expected = self.header_hashes.get(height - 1)
+                if expected is not None and expected != prev_hash:
+                    await self.rollback(height - 1)
+                    break
+                await self.apply_block(height, header_hash, is_transaction_block)
+
+    async def block_range(self, start: int, end: int) -> List[Tuple[int, bytes32, bytes32, bool]]:
+        records = await self.client.get_block_records(start, end)
+        return [(record["height"], bytes32.from_hexstr(record["header_hash"]),
+                 bytes32.from_hexstr(record["prev_hash"]), record["timestamp"] is not None)
+                for record in records]
+
+    async def apply_block(self, height: int, header_hash: bytes32, is_transaction_block: bool):
+        """Advance the NFTs whose tracked coin was spent in the block at height"""
+        changed = set()
+        if is_transaction_block:
+            _, removals = await self.client.get_additions_and_removals(header_hash)
+            for removal in removals:
+                nft_id = self.index.nft_for_coin(removal.name)
+                if nft_id is not None:
+                    resolution = await advance_resolution(self.client, self.index.resolutions[nft_id], height)
+                    self.index.update(resolution)
+                    changed.add(nft_id)
+                    print(f"{nft_id} moved at height {height}: {resolution.owner}")
+
+        self.header_hashes[height] = header_hash
+        if changed:
+            self.changes[height] = changed
+        self.index.height = height
+        self._prune(height - REORG_DEPTH)
+
+    async def rollback(self, height: int):
+        """Rewind the index to the last height still on the node's chain"""
+        fork_height = height
+        found = False
+        while fork_height in self.header_hashes:
+            block = await self.client.get_block_record_by_height(fork_height)
+            if block is not None and block.header_hash == self.header_hashes[fork_height]:
+                found = True
+                break
+            fork_height -= 1
+
+        affected = set()
+        for changed_height in [h for h in self.changes if h > fork_height]:
+            affected |= self.changes.pop(changed_height)
+        if not found:
+            # Deeper than the remembered window, re-resolve everything on the node's chain
+            affected = set(self.index.resolutions)
+        for orphaned_height in [h for h in self.header_hashes if h > fork_height]:
+            del self.header_hashes[orphaned_height]
+
+        print(f"Reorg detected, rolling back to height {fork_height}")
+        for nft_id in affected:
+            self.index.update(await resolve_nft_at_height(self.client, nft_id, fork_height))
+        self.index.height = fork_height
+
+    def _prune(self, below: int):
+        for height in [h for h in self.header_hashes if h < below]:
+            del self.header_hashes[height]
+            self.changes.pop(height, None)
@@ -0,0 +1,205 @@
+"""
+Library interface for resolving a collection's owners as a stream
+
+    async for owner in resolve_collection(collection_id, target_height, rpc_cache="rpc_cache.sqlite"):
+        print(owner.nft_id, owner.xch_address)
+
+Owners come out as soon as they are resolved and verified, in no particular order. At most
+`concurrency` NFTs are resolved at a time, and resolution pauses once `buffer` resolved NFTs are
+waiting to be read, so a slow consumer holds back the node and MintGarden instead of piling up
+results.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import (TYPE_CHECKING, AbstractSet, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List,
+                    Optional, Tuple, Union)
+
+from analytics import HolderStats
+from metadata_index import MetadataIndex, NFTMetadata
+from records import NFTListing, OwnerRecord, ResolutionError, ResolvedNFT
+
+if TYPE_CHECKING:
+    from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+    from chia.types.blockchain_format.sized_bytes import bytes32
+    from timeline import OwnershipTimeline
+
+# Resolved owners held for a consumer that is not reading them yet
+STREAM_BUFFER = 100
+# Seconds a resolved owner waits for more to verify with in one bulk lookup, unless a batch fills first
+VERIFY_WINDOW = 0.5
+
+
+async def resolve_collection(collection_id: str, target_height: int, client: Optional[FullNodeRpcClient] = None,
+                             rpc_cache: Optional[str] = None, node_db: Optional[str] = None,
+                             concurrency: int = 20, nft_timeout: float = 300, buffer: int = STREAM_BUFFER,
+                             excluded: Optional[AbstractSet[bytes32]] = None,
+                             eligible: Optional[Callable[[NFTMetadata], bool]] = None,
+                             metadata: Optional[MetadataIndex] = None, limit: Optional[int] = None,
+                             errors: Optional[List[ResolutionError]] = None, held_since: Optional[int] = None,
+                             timelines: Optional[Dict[str, OwnershipTimeline]] = None,
+                             stats: Optional[HolderStats] = None) -> AsyncIterator[OwnerRecord]:
+    """
+    Yield the eligible owners of a MintGarden collection at target_height as they are resolved
+    Without a client, one is connected to the local full node, wrapped in the same cache layers
+    as a scan and closed when the stream ends; a given client is used as it is and left open.
+    Args:
+        collection_id: The collection ID from MintGarden
+        target_height: Block height ownership is resolved at
+        client: Full node client, e.g. from find_owners.wrap_node_client
+        rpc_cache: Path of the persistent RPC cache for a connected client, None for no cache
+        node_db: Path of the node's blockchain database, or "auto", for a connected client
+        concurrency: Number of NFTs resolved at the same time
+        nft_timeout: Seconds allowed for a single NFT before it is queued for a retry
+        buffer: Owners resolved ahead of the consumer before resolution pauses
+        excluded: Owner puzzle hashes that are not eligible, defaults to the cached exclusion set
+        eligible: Metadata filter; NFTs it rejects are skipped before any node lookup
+        metadata: Index that every listed NFT's metadata is added to
+        limit: Stop listing the collection once this many NFTs have been listed, checked per page
+        errors: Filled with the NFTs whose owner could not be determined
+        held_since: Only owners that have held the NFT without interruption since this height are eligible
+        timelines: Filled with the ownership timeline of every resolved NFT, up to target_height
+        stats: Holder statistics the NFTs held by excluded owners are counted in
+    """
+    from find_owners import connect_full_node, wrap_node_client
+
+    own_client = client is None
+    if own_client:
+        client = await connect_full_node()
+        if client is None:
+            raise Exception("Could not connect to the full node")
+        client = await wrap_node_client(client, rpc_cache, node_db)
+
+    try:
+        if excluded is None:
+            from exclusions import load_exclusions
+
+            excluded = (await load_exclusions(client, target_height)).puzzle_hashes
+
+        listings = collection_listings(collection_id, metadata, eligible, limit)
+        async for owner in resolve_listings(client, listings, target_height, concurrency, nft_timeout, buffer,
+                                            excluded, errors, held_since, timelines, stats):
+            yield owner
+    finally:
+        if own_client:
+            client.close()
+
+
+async def collection_listings(collection_id: str, metadata: Optional[MetadataIndex] = None,
+                              eligible: Optional[Callable[[NFTMetadata], bool]] = None,
+                              limit: Optional[int] = None) -> AsyncIterator[NFTListing]:
+    """
+    Yield the listings of a collection's NFTs that are to be resolved, page by page
+    Pages are fetched in a worker thread so resolutions already running are not held up.
+    """
+    from find_owners import eligible_listings, fetch_collection_items
+
+    pages = fetch_collection_items(collection_id)
+    listings_by_id: Dict[str, NFTListing] = {}
+    listed = 0
+    while limit is None or listed < limit:
+        items = await asyncio.to_thread(next, pages, None)
+        if items is None:
+            break
+        listed += len(items)
+        for listing in eligible_listings(items, listings_by_id, metadata, eligible):
+            yield listing
+
+
+async def resolve_listings(client: FullNodeRpcClient, listings: Union[Iterable[NFTListing], AsyncIterable[NFTListing]],
+                           target_height: int, concurrency: int = 20, nft_timeout: float = 300,
+                           buffer: int = STREAM_BUFFER, excluded: AbstractSet[bytes32] = frozenset(),
+                           errors: Optional[List[ResolutionError]] = None, held_since: Optional[int] = None,
+                           timelines: Optional[Dict[str, OwnershipTimeline]] = None,
+                           stats: Optional[HolderStats] = None) -> AsyncIterator[OwnerRecord]:
+    """
+    Yield the eligible owners of listings at target_height as they are resolved
+    Owners are found, retried and checked against bulk coin record lookups by the same
+    OwnerResolver as a scan, so the stream holds the owners a scan would find. An owner is yielded
+    once VERIFY_BATCH_SIZE owners or VERIFY_WINDOW seconds have gathered for its lookup. Stopping
+    early cancels the resolutions still running.
+    Args:
+        client: Full node client
+        listings: NFTs to resolve, read only as fast as they are resolved
+        target_height: Block height ownership is resolved at
+        concurrency: Number of NFTs resolved at the same time
+        nft_timeout: Seconds allowed for a single NFT before it is queued for a retry
+        buffer: Owners resolved ahead of the consumer before resolution pauses
+        excluded: Owner puzzle hashes that are not eligible
+        errors: Filled with the NFTs whose owner could not be determined
+        held_since: Only owners that have held the NFT without interruption since this height are eligible
+        timelines: Filled with the ownership timeline of every resolved NFT, up to target_height
+        stats: Holder statistics the NFTs held by excluded owners are counted in
+    """
+    from nft import VERIFY_BATCH_SIZE
+    from resolver import OwnerResolver
+
+    listings_by_id: Dict[str, NFTListing] = {}
+    resolver = OwnerResolver(client, listings_by_id, target_height, concurrency, nft_timeout, excluded, held_since,
+                             timelines, stats, errors)
+    pending: asyncio.Queue = asyncio.Queue(concurrency)
+    # (owner record, resolution) pairs, then None once everything has been resolved
+    resolved: asyncio.Queue = asyncio.Queue(buffer)
+
+    async def work():
+        while (listing := await pending.get()) is not None:
+            for owner in await resolver.resolve([listing.nft_id]):
+                await resolved.put(owner)
+
+    async def produce():
+        workers = [asyncio.create_task(work()) for _ in range(concurrency)]
+        try:
+            if isinstance(listings, AsyncIterable):
+                async for listing in listings:
+                    listings_by_id[listing.nft_id] = listing
+                    await pending.put(listing)
+            else:
+                for listing in listings:
+                    listings_by_id[listing.nft_id] = listing
+                    await pending.put(listing)
+            for _ in workers:
+                await pending.put(None)
+            await asyncio.gather(*workers)
+
+            for owner in await resolver.retry():
+                await resolved.put(owner)
+            await resolved.put(None)
+        except Exception as e:
+            await resolved.put(e)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    def last(entry) -> bool:
+        return entry is None or isinstance(entry, Exception)
+
+    loop = asyncio.get_running_loop()
+    producer = asyncio.create_task(produce())
+    try:
+        done = False
+        while not done:
+            # Collect a full batch for one bulk lookup, or whatever arrives within VERIFY_WINDOW of the
+            # first owner, so a consumer that keeps up does not cost a lookup per owner
+            entries = [await resolved.get()]
+            deadline = loop.time() + VERIFY_WINDOW
+            while len(entries) < VERIFY_BATCH_SIZE and not last(entries[-1]):
+                try:
+                    entries.append(await asyncio.wait_for(resolved.get(), deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+
+            owners: List[Tuple[OwnerRecord, ResolvedNFT]] = []
+            for entry in entries:
+                if entry is None:
+                    done = True
+                elif isinstance(entry, Exception):
+                    raise entry
+                else:
+                    owners.append(entry)
+
+            failed = await resolver.verify(resolution for _, resolution in owners)
+            for owner, _ in owners:
+                if owner.nft_id not in failed:
+                    yield owner
+    finally:
+        producer.cancel()
@@ -0,0 +1,207 @@
+import operator
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sorting import parse_edition
+
+
+@dataclass(slots=True)
+class NFTMetadata:
+    """Listing metadata of an NFT, with trait names and values lower-cased for matching"""
+    nft_id: str
+    name: str
+    edition: Optional[int] = None
+    rarity_rank: Optional[int] = None
+    traits: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_item(cls, item: Dict) -> "NFTMetadata":
+        """Build from a MintGarden collection listing item, ignoring fields it does not carry"""
+        attributes = item.get("attributes")
+        if attributes is None:
+            attributes = (item.get("metadata_json") or {}).get("attributes") or []
+
+        # Trait names and values repeat across a collection, interning keeps one copy of each
+        traits = {}
+        for attribute in attributes:
+            if isinstance(attribute, dict) and attribute.get("trait_type") is not None:
+                trait = sys.intern(str(attribute["trait_type"]).lower())
+                traits[trait] = sys.intern(str(attribute.get("value", "")).lower())
+
+        rarity_rank = item.get("rarity_rank", item.get("openrarity_rank"))
+        return cls(item["encoded_id"], item["name"], parse_edition(item["name"], item.get("edition_number")),
+                   int(rarity_rank) if rarity_rank is not None else None, traits)
+
+
+class MetadataIndex:
+    """
+    Metadata of every listed NFT in a collection
+    Built from the listing pages as they are fetched. matched counts the listed NFTs that the
+    eligibility filter accepted, as the filter is applied to them.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, NFTMetadata] = {}
+        self.matched = 0
+
+    def add(self, metadata: NFTMetadata):
+        self.entries[metadata.nft_id] = metadata
+
+
+class FilterError(ValueError):
+    pass
+
+
+TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<paren>[()])
+      | (?P<op><=|>=|!=|=|<|>|~)
+      | (?P<string>"[^"]*"|'[^']*')
+      | (?P<word>[^\s()<>=!~"']+(?:"[^"]*"|'[^']*')?)
+    )''', re.VERBOSE)
+
+COMPARISONS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "~": lambda value, expected: expected in value,
+}
+
+NUMERIC_FIELDS = ("edition", "rarity")
+
+
+def compile_filter(expression: str) -> Callable[[NFTMetadata], bool]:
+    """
+    Compile an eligibility expression into a predicate over NFTMetadata
+    Grammar:
+        expression  := term ("or" term)*
+        term        := factor ("and" factor)*
+        factor      := "not" factor | "(" expression ")" | comparison
+        comparison  := field [op value]
+        field       := edition | rarity | name | trait.<name> | trait."<name with spaces>"
+        op          := = | != | < | <= | > | >= | ~ (contains)
+    A bare trait field matches NFTs that have the trait. Text is compared case-insensitively,
+    edition and rarity numerically. Comparisons against a missing field are false, except !=.
+    Examples:
+        trait.background = gold and edition <= 100
+        not trait."head wear" ~ hat or rarity < 50
+    """
+    tokens = _tokenize(expression)
+    predicate, position = _parse_or(tokens, 0)
+    if position != len(tokens):
+        raise FilterError(f"Unexpected {tokens[position][1]!r} in filter")
+    return predicate
+
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if match is None or match.end() == position:
+            raise FilterError(f"Cannot parse filter at: {expression[position:]!r}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "word" and text.lower() in ("and", "or", "not"):
+            kind = text.lower()
+        tokens.append((kind, text))
+        position = match.end()
+    return tokens
+
+
+def _parse_or(tokens, position):
+    left, position = _parse_and(tokens, position)
+    while position < len(tokens) and tokens[position][0] == "or":
+        right, position = _parse_and(tokens, position + 1)
+        left = (lambda a, b: lambda m: a(m) or b(m))(left, right)
+    return left, position
+
+
+def _parse_and(tokens, position):
+    left, position = _parse_not(tokens, position)
+    while position < len(tokens) and tokens[position][0] == "and":
+        right, position = _parse_not(tokens, position + 1)
+        left = (lambda a, b: lambda m: a(m) and b(m))(left, right)
+    return left, position
+
+
+def _parse_not(tokens, position):
+    if position >= len(tokens):
+        raise FilterError("Filter ends unexpectedly")
+
+    kind, text = tokens[position]
+    if kind == "not":
+        inner, position = _parse_not(tokens, position + 1)
+        return (lambda m: not inner(m)), position
+    if kind == "paren" and text == "(":
+        inner, position = _parse_or(tokens, position + 1)
+        if position >= len(tokens) or tokens[position] != ("paren", ")"):
+            raise FilterError("Missing closing parenthesis in filter")
+        return inner, position + 1
+    if kind != "word":
+        raise FilterError(f"Expected a field, found {text!r}")
+
+    getter = _field_getter(text)
+    position += 1
+    if position >= len(tokens) or tokens[position][0] != "op":
+        # Bare field: present and non-empty
+        return (lambda m: getter(m) not in (None, "")), position
+
+    op = tokens[position][1]
+    if position + 1 >= len(tokens) or tokens[position + 1][0] not in ("word", "string"):
+        raise FilterError(f"Expected a value after {op!r}")
+    value = _unquote(tokens[position + 1][1]).lower()
+    return _comparison(text, getter, op, value), position + 2
+
+
+def _field_getter(name: str) -> Callable[[NFTMetadata], object]:
+    lowered = name.lower()
+    if lowered == "edition":
+        return lambda m: m.edition
+    if lowered == "rarity":
+        return lambda m: m.rarity_rank
+    if lowered == "name":
+        return lambda m: m.name.lower()
+    if lowered.startswith("trait."):
+        trait = _unquote(name[len("trait."):]).lower()
+        return lambda m: m.traits.get(trait)
+    raise FilterError(f"Unknown filter field {name!r}, expected edition, rarity, name or trait.<name>")
+
+
+def _comparison(name: str, getter: Callable, op: str, value: str) -> Callable[[NFTMetadata], bool]:
+    compare = COMPARISONS[op]
+    if name.lower() in NUMERIC_FIELDS:
+        try:
+            expected = int(value)
+        except ValueError:
+            raise FilterError(f"{name} is compared with a number, got {value!r}")
+        if op == "~":
+            raise FilterError("~ only applies to text fields")
+    else:
+        expected = value
+
+    def predicate(metadata: NFTMetadata) -> bool:
+        actual = getter(metadata)
+        if actual is None:
+            return op == "!="
+        if isinstance(expected, str) and op in ("<", "<=", ">", ">="):
+            # Numeric trait values such as levels compare as numbers when both sides allow it
+            try:
+                return compare(float(actual), float(expected))
+            except ValueError:
+                pass
+        return compare(actual, expected)
+
+    return predicate
+
+
+def _unquote(text: str) -> str:
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        return text[1:-1]
+    return text
@@ -1,106 +1,232 @@
-import os
-import sys
-from typing import List, Optional, Dict
+import asyncio
+import itertools
+from typing import Iterable, List, Optional, Tuple
 
-from chia.consensus.default_constants import DEFAULT_CONSTANTS
 from chia.rpc.full_node_rpc_client import FullNodeRpcClient
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.coin_record import CoinRecord
+from chia.types.coin_spend import CoinSpend
 from chia_rs import Coin
-from chia.util.condition_tools import conditions_dict_for_solution
 from chia.types.blockchain_format.program import Program
 from chia.types.condition_opcodes import ConditionOpcode
 from chia.wallet.nft_wallet.nft_puzzles import get_metadata_and_phs
 from chia.wallet.nft_wallet.uncurry_nft import UncurriedNFT
-from chia.util.bech32m import encode_puzzle_hash, decode_puzzle_hash
+from chia.util.bech32m import decode_puzzle_hash
+from puzzle_layers import UNHANDLED, owner_from_layers
+from records import OwnershipStatus, ResolvedNFT
+from timeline import OwnershipHop, OwnershipTimeline
+
+# Number of coin ids sent in a single get_coin_records_by_names call during verification
+VERIFY_BATCH_SIZE = 500
+# CLVM cost allowed for a single spend. NFT spends cost around 1.3 million, the limit for a whole
+# block (MAX_BLOCK_COST_CLVM) is 11 billion
+SPEND_COST_LIMIT = 1_000_000_000
+CREATE_COIN = bytes(ConditionOpcode.CREATE_COIN)
+
+
+async def resolve_nft_at_height(client: FullNodeRpcClient, nft_id: str, target_height: int) -> ResolvedNFT:
+    """
+    Resolve the owner of an NFT as of target_height
+    Walks the singleton from its launcher to the coin that was unspent at target_height and
+    decodes the owner from the spend that created that coin.
+    Args:
+        client: FullNodeRpcClient
+        nft_id: The nft1... id of the NFT
+        target_height: Block height the ownership is pinned to
+    """
+    launcher_id = decode_puzzle_hash(nft_id)
+    current_coin = await client.get_coin_record_by_name(launcher_id)
+    if current_coin is None:
+        return ResolvedNFT(nft_id, OwnershipStatus.NOT_FOUND)
+
+    if not spent_at(current_coin, target_height):
+        # Keep the launcher as the coin to watch so the NFT can be picked up once minted
+        return ResolvedNFT(nft_id, OwnershipStatus.NOT_MINTED, coin_id=current_coin.name,
+                           confirmed_height=current_coin.confirmed_block_index)
 
+    return await walk_to_height(client, nft_id, current_coin, target_height)
 
-async def get_nft_info(client: FullNodeRpcClient, nft_id: str, target_height: int) -> Dict:
-    nft_info = {
-        "nft_id": "",
-        "current_address": "",
-    }
 
-    launcher_coin = decode_puzzle_hash(nft_id)
-    current_coin = await get_last_child(client, launcher_coin, target_height)
-    coin_bytes = current_coin.name
+async def advance_resolution(client: FullNodeRpcClient, resolution: ResolvedNFT, target_height: int) -> ResolvedNFT:
+    """
+    Move an earlier resolution forward to target_height
+    Continues the singleton walk from the previously resolved coin instead of the launcher.
+    """
+    current_coin = await client.get_coin_record_by_name(resolution.coin_id)
+    if current_coin is None:
+        raise ValueError(f"Could not find coin {resolution.coin_id.hex()}")
 
-    coin_record = await client.get_coin_record_by_name(coin_bytes)
-    assert coin_record is not None
+    if not spent_at(current_coin, target_height):
+        return resolution
 
-    puzz_solution = await client.get_puzzle_and_solution(coin_record.coin.parent_coin_info,
-                                                         coin_record.confirmed_block_index)
+    return await walk_to_height(client, resolution.nft_id, current_coin, target_height)
 
-    puzzle: Program = Program.from_bytes(bytes(puzz_solution.puzzle_reveal))
 
-    uncurried_nft = UncurriedNFT.uncurry(*puzzle.uncurry())
-    assert uncurried_nft is not None
-    nft_id = encode_puzzle_hash(uncurried_nft.singleton_launcher_id, "nft")
-    nft_info["nft_id"] = nft_id
+async def walk_to_height(client: FullNodeRpcClient, nft_id: str, current_coin: CoinRecord,
+                         target_height: int) -> ResolvedNFT:
+    """
+    Follow a singleton from a coin spent at or before target_height to the coin unspent at it
+    """
+    parent_spend = None
+    while spent_at(current_coin, target_height):
+        parent_spend, child = await next_hop(client, current_coin)
+        if child is None:
+            return ResolvedNFT(nft_id, OwnershipStatus.MELTED, coin_id=current_coin.name,
+                               confirmed_height=current_coin.confirmed_block_index)
+        current_coin = child
 
-    (_, puzzlehash) = get_metadata_and_phs(uncurried_nft, puzz_solution.solution)
-    current_address = encode_puzzle_hash(puzzlehash, "xch")
-    nft_info["current_address"] = current_address
+    result = ResolvedNFT(nft_id, OwnershipStatus.UNDECODABLE, coin_id=current_coin.name,
+                         confirmed_height=current_coin.confirmed_block_index)
 
-    return nft_info
+    result.owner_puzzle_hash = owner_from_spend(parent_spend)
+    if result.owner_puzzle_hash is not None:
+        result.status = OwnershipStatus.OWNED
 
+    return result
 
-# Gets the last child coin
-async def get_last_child(client: FullNodeRpcClient, coin_id: bytes32, target_height: int) -> Optional[CoinRecord]:
-    current_coin = await client.get_coin_record_by_name(coin_id)
+
+async def walk_timeline(client: FullNodeRpcClient, nft_id: str, until_height: int) -> OwnershipTimeline:
+    """
+    Walk an NFT's singleton from its launcher up to until_height, recording every hop
+    Costs the same node calls as resolving the NFT at until_height once, and answers ownership at
+    every earlier height as well.
+    """
+    timeline = OwnershipTimeline(nft_id, until_height)
+    current_coin = await client.get_coin_record_by_name(decode_puzzle_hash(nft_id))
     if current_coin is None:
-        print(f"The fuck man: {coin_id}")
-        sys.exit(1)
+        return timeline
 
-    while True:
-        if current_coin is None:
-            raise ValueError(f"Could not find coin {coin_id.hex()}")
+    timeline.launcher_id = current_coin.name
+    timeline.launcher_height = current_coin.confirmed_block_index
+    if spent_at(current_coin, until_height):
+        timeline.minted_height = current_coin.spent_block_index
 
-        if current_coin.spent_block_index == 0:
-            return current_coin
+    while spent_at(current_coin, until_height):
+        spend, child = await next_hop(client, current_coin)
+        if child is None:
+            timeline.melted_height = current_coin.spent_block_index
+            break
 
-        if current_coin.spent_block_index > target_height:
-            return current_coin
+        current_coin = child
+        timeline.hops.append(OwnershipHop(current_coin.confirmed_block_index, current_coin.name,
+                                          owner_from_spend(spend)))
 
-        conditions = await get_conditions_for_coin(client, current_coin)
-        if conditions is None:
-            return None
+    return timeline
 
-        if ConditionOpcode.CREATE_COIN not in conditions:
-            return None
 
-        coins = coins_from_create_coin_condition(conditions, current_coin.coin.name())
-        if len(coins) > 1:
-            return None
+async def next_hop(client: FullNodeRpcClient, coin: CoinRecord) -> Tuple[CoinSpend, Optional[CoinRecord]]:
+    """
+    Spend of a spent singleton coin and the record of the coin it recreated itself as, or None if melted
+    The spend and the coins created in the same block by the same parent are requested together,
+    so a hop waits for one round trip to the node instead of two in a row.
+    """
+    spend, children = await asyncio.gather(
+        client.get_puzzle_and_solution(coin.name, coin.spent_block_index),
+        client.get_coin_records_by_parent_ids([coin.name], True, coin.spent_block_index,
+                                              coin.spent_block_index + 1))
+    if spend is None:
+        raise ValueError(f"Could not find spend of coin {coin.name.hex()}")
 
-        current_coin = await client.get_coin_record_by_name(coins[0].name())
-        if current_coin is None:
-            return current_coin
+    child = singleton_child(spend)
+    if child is None:
+        return spend, None
 
-        if current_coin.spent_block_index == 0:
-            return current_coin
+    child_id = child.name()
+    for record in children:
+        if record.name == child_id:
+            return spend, record
 
+    record = await client.get_coin_record_by_name(child_id)
+    if record is None:
+        raise ValueError(f"Could not find coin {child_id.hex()}")
+    return spend, record
 
-async def get_conditions_for_coin(client: FullNodeRpcClient, coin: CoinRecord):
-    # Height for this is the height the coin was spent at
-    puzz_solution = await client.get_puzzle_and_solution(coin.name, coin.spent_block_index)
 
-    assert puzz_solution is not None
+async def verify_resolutions(client: FullNodeRpcClient, resolutions: Iterable[ResolvedNFT], target_height: int,
+                             batch_size: int = VERIFY_BATCH_SIZE) -> List[ResolvedNFT]:
+    """
+    Check that every owned NFT's coin was created at or before target_height and unspent at it
+    Coin records are fetched in bulk, so this costs one RPC per batch_size NFTs. resolutions is
+    read one batch at a time and may be a SpillList.
+    Returns the resolutions that failed the check.
+    """
+    owned = (r for r in resolutions if r.status == OwnershipStatus.OWNED)
+    failed = []
 
-    conditions = conditions_dict_for_solution(
-        puzz_solution.puzzle_reveal,
-        puzz_solution.solution,
-        DEFAULT_CONSTANTS.MAX_BLOCK_COST_CLVM)
+    while batch := list(itertools.islice(owned, batch_size)):
+        records = await client.get_coin_records_by_names([r.coin_id for r in batch], include_spent_coins=True)
+        records_by_name = {record.name: record for record in records}
 
-    return conditions
+        for resolution in batch:
+            record = records_by_name.get(resolution.coin_id)
+            if (record is None or record.confirmed_block_index > target_height
+                    or spent_at(record, target_height)):
+                failed.append(resolution)
 
+    return failed
+
+
+def spent_at(coin: CoinRecord, height: int) -> bool:
+    return coin.spent and coin.spent_block_index <= height
 
-def coins_from_create_coin_condition(conditions, parent_coin_info: bytes32) -> List[Coin]:
-    output_coins: List[Coin] = []
 
-    for create_coin in conditions.get(ConditionOpcode.CREATE_COIN, []):
-        puzzle_hash = create_coin.vars[0]
-        amount = int.from_bytes(create_coin.vars[1], byteorder='big')
-        output_coins.append(Coin(parent_coin_info, puzzle_hash, amount))
+def singleton_child(spend: CoinSpend) -> Optional[Coin]:
+    # A singleton recreates itself as its only odd amount output
+    children = [coin for coin in created_coins(spend) if coin.amount % 2 == 1]
+    if len(children) != 1:
+        return None
+
+    return children[0]
+
+
+def owner_from_spend(spend: CoinSpend) -> Optional[bytes32]:
+    owner = owner_from_layers(spend, SPEND_COST_LIMIT)
+    if owner is not UNHANDLED:
+        return owner
+
+    puzzle: Program = Program.from_bytes(bytes(spend.puzzle_reveal))
+
+    uncurried_nft = UncurriedNFT.uncurry(*puzzle.uncurry())
+    if uncurried_nft is None:
+        return None
+
+    try:
+        (_, puzzlehash) = get_metadata_and_phs(uncurried_nft, spend.solution)
+    except AssertionError:
+        # Spend did not carry a destination puzzle hash memo
+        return None
+    return puzzlehash
+
+
+def created_coins(spend: CoinSpend, max_cost: int = SPEND_COST_LIMIT) -> List[Coin]:
+    """
+    Coins created by a spend, read from its CREATE_COIN conditions
+    The puzzle runs in chia_rs with a cost limit for this one spend, and the conditions it returns
+    are walked as raw CLVM nodes, skipping everything but CREATE_COIN instead of parsing each
+    condition into a ConditionWithArgs.
+    """
+    try:
+        _, output = spend.puzzle_reveal.run_with_cost(max_cost, spend.solution)
+    except ValueError as e:
+        if e.args and e.args[0] == "cost exceeded":
+            raise ValueError(f"Spend of coin {spend.coin.name().hex()} costs more than {max_cost}")
+        raise
+
+    parent_coin_info = spend.coin.name()
+    output_coins: List[Coin] = []
+    conditions = output.pair
+    while conditions is not None:
+        condition, rest = conditions
+        conditions = rest.pair
+        if condition.pair is None or condition.pair[0].atom != CREATE_COIN:
+            continue
+
+        # (51 puzzle_hash amount . memos)
+        args = condition.pair[1].pair
+        if args is None or args[1].pair is None:
+            raise ValueError(f"Malformed CREATE_COIN in spend of coin {parent_coin_info.hex()}")
+        puzzle_hash = args[0].atom
+        amount = args[1].pair[0].atom
+        output_coins.append(Coin(parent_coin_info, bytes32(puzzle_hash), int.from_bytes(amount, byteorder='big')))
 
     return output_coins
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.coin_record import CoinRecord
+from chia.util.ints import uint32, uint64
+from chia_rs import Coin
+
+# The full node's coin_record table (chia/full_node/coin_store.py), for building fixture databases
+COIN_RECORD_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS coin_record(
+        coin_name blob PRIMARY KEY,
+        confirmed_index bigint,
+        spent_index bigint,
+        coinbase int,
+        puzzle_hash blob,
+        coin_parent blob,
+        amount blob,
+        timestamp bigint);
+    CREATE INDEX IF NOT EXISTS coin_confirmed_index on coin_record(confirmed_index);
+    CREATE INDEX IF NOT EXISTS coin_spent_index on coin_record(spent_index);
+    CREATE INDEX IF NOT EXISTS coin_puzzle_hash on coin_record(puzzle_hash);
+    CREATE INDEX IF NOT EXISTS coin_parent_index on coin_record(coin_parent);
+"""
+
+COIN_RECORD_COLUMNS = "confirmed_index, spent_index, coinbase, puzzle_hash, coin_parent, amount, timestamp"
+# Ids per IN (...) query, below SQLite's default limit on bound parameters
+SQL_BATCH_SIZE = 900
+
+
+def node_database_path(root_path, config: Dict) -> str:
+    """Path of the full node's blockchain database for the selected network"""
+    full_node = config["full_node"]
+    return os.path.join(root_path, full_node["database_path"].replace("CHALLENGE", full_node["selected_network"]))
+
+
+def default_node_database_path() -> str:
+    """Database of the local full node, as configured in its config.yaml"""
+    from chia.util.config import load_config
+    from chia.util.default_root import DEFAULT_ROOT_PATH
+
+    return node_database_path(DEFAULT_ROOT_PATH, load_config(DEFAULT_ROOT_PATH, "config.yaml"))
+
+
+class SQLiteFullNodeClient:
+    """
+    FullNodeRpcClient wrapper that answers coin record queries from the node's database
+    The node's blockchain_v2 database is opened read-only and queried through its own indexes,
+    with many ids per query. Everything else, e.g. puzzles and solutions and block records, is
+    delegated to the RPC client. Queries are indexed lookups, so they run on the event loop's
+    thread instead of paying for a hop to a worker thread.
+    """
+
+    def __init__(self, client: FullNodeRpcClient, path: str, batch_size: int = SQL_BATCH_SIZE):
+        self.client = client
+        self.batch_size = batch_size
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self.db.execute("PRAGMA query_only = ON")
+        self.queries = 0
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def get_coin_record_by_name(self, coin_id: bytes32) -> Optional[CoinRecord]:
+        self.queries += 1
+        row = self.db.execute(f"SELECT {COIN_RECORD_COLUMNS} FROM coin_record WHERE coin_name = ?",
+                              (bytes(coin_id),)).fetchone()
+        return row_to_coin_record(row) if row is not None else None
+
+    async def get_coin_records_by_names(self, names: List[bytes32], include_spent_coins: bool = True,
+                                        start_height: Optional[int] = None,
+                                        end_height: Optional[int] = None) -> List[CoinRecord]:
+        return self._select_in("coin_name", names, include_spent_coins, start_height, end_height)
+
+    async def get_coin_records_by_parent_ids(self, parent_ids: List[bytes32], include_spent_coins: bool = True,
+                                             start_height: Optional[int] = None,
+                                             end_height: Optional[int] = None) -> List[CoinRecord]:
+        return self._select_in("coin_parent", parent_ids, include_spent_coins, start_height, end_height)
+
+    async def get_coin_records_by_puzzle_hashes(self, puzzle_hashes: List[bytes32], include_spent_coins: bool = True,
+                                                start_height: Optional[int] = None,
+                                                end_height: Optional[int] = None) -> List[CoinRecord]:
+        return self._select_in("puzzle_hash", puzzle_hashes, include_spent_coins, start_height, end_height)
+
+    def _select_in(self, column: str, values: Sequence[bytes32], include_spent_coins: bool,
+                   start_height: Optional[int], end_height: Optional[int]) -> List[CoinRecord]:
+        # Same filters as the RPC: start_height <= confirmed_index < end_height
+        filters = ""
+        extra = []
+        if start_height is not None:
+            filters += " AND confirmed_index >= ?"
+            extra.append(start_height)
+        if end_height is not None:
+            filters += " AND confirmed_index < ?"
+            extra.append(end_height)
+        if not include_spent_coins:
+            filters += " AND spent_index = 0"
+
+        records = []
+        values = list(dict.fromkeys(bytes(value) for value in values))
+        for start in range(0, len(values), self.batch_size):
+            batch = values[start:start + self.batch_size]
+            self.queries += 1
+            rows = self.db.execute(f"SELECT {COIN_RECORD_COLUMNS} FROM coin_record "
+                                   f"WHERE {column} IN ({','.join('?' * len(batch))}){filters}", batch + extra)
+            records.extend(row_to_coin_record(row) for row in rows)
+        return records
+
+    def close(self):
+        self.db.close()
+        self.client.close()
+
+
+def row_to_coin_record(row) -> CoinRecord:
+    confirmed_index, spent_index, coinbase, puzzle_hash, parent, amount, timestamp = row
+    coin = Coin(bytes32(parent), bytes32(puzzle_hash), uint64(int.from_bytes(amount, "big")))
+    return CoinRecord(coin, uint32(confirmed_index), uint32(max(spent_index, 0)), bool(coinbase), uint64(timestamp))
+
+
+def write_coin_records(path: str, records: Iterable[CoinRecord]):
+    """Create a database with the node's coin_record schema holding records, e.g. as a test fixture"""
+    db = sqlite3.connect(path)
+    with db:
+        db.executescript(COIN_RECORD_SCHEMA)
+        db.executemany("INSERT OR REPLACE INTO coin_record VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+            (bytes(record.name), record.confirmed_block_index, record.spent_block_index, int(record.coinbase),
+             bytes(record.coin.puzzle_hash), bytes(record.coin.parent_coin_info),
+             int(record.coin.amount).to_bytes(8, "big"), record.timestamp)
+            for record in records])
+    db.close()
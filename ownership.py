@@ -0,0 +1,65 @@
+from collections import defaultdict
+from typing import AbstractSet, Dict, List, Optional, Set
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from records import NFTListing, OwnerRecord, OwnershipStatus, ResolvedNFT
+from sorting import edition_sort_key
+
+
+class OwnershipIndex:
+    """
+    Latest resolution of every NFT in a collection, indexed by coin and by holder
+    The eligible snapshot is built lazily and cached until the next update.
+    """
+
+    def __init__(self, listings: Dict[str, NFTListing], excluded_puzzle_hashes: AbstractSet[bytes32]):
+        self.listings = listings
+        self.excluded_puzzle_hashes = excluded_puzzle_hashes
+        self.height = 0
+        self.resolutions: Dict[str, ResolvedNFT] = {}
+        self.coins: Dict[bytes32, str] = {}
+        self.holdings: Dict[bytes32, Set[str]] = defaultdict(set)
+        self._snapshot: Optional[List[OwnerRecord]] = None
+
+    def update(self, resolution: ResolvedNFT):
+        previous = self.resolutions.get(resolution.nft_id)
+        if previous is not None:
+            self.coins.pop(previous.coin_id, None)
+            if previous.owner_puzzle_hash is not None:
+                holding = self.holdings[previous.owner_puzzle_hash]
+                holding.discard(previous.nft_id)
+                if not holding:
+                    del self.holdings[previous.owner_puzzle_hash]
+
+        self.resolutions[resolution.nft_id] = resolution
+        if resolution.coin_id is not None:
+            self.coins[resolution.coin_id] = resolution.nft_id
+        if resolution.status == OwnershipStatus.OWNED:
+            self.holdings[resolution.owner_puzzle_hash].add(resolution.nft_id)
+
+        self._snapshot = None
+
+    def nft_for_coin(self, coin_id: bytes32) -> Optional[str]:
+        return self.coins.get(coin_id)
+
+    def is_eligible(self, puzzle_hash: bytes32) -> bool:
+        return puzzle_hash not in self.excluded_puzzle_hashes
+
+    def holder(self, puzzle_hash: bytes32) -> List[OwnerRecord]:
+        records = [self._owner_record(self.resolutions[nft_id]) for nft_id in self.holdings.get(puzzle_hash, ())]
+        records.sort(key=edition_sort_key)
+        return records
+
+    def snapshot(self) -> List[OwnerRecord]:
+        """Eligible owner records in edition order"""
+        if self._snapshot is None:
+            self._snapshot = sorted(
+                (self._owner_record(self.resolutions[nft_id])
+                 for puzzle_hash, nft_ids in self.holdings.items() if self.is_eligible(puzzle_hash)
+                 for nft_id in nft_ids),
+                key=edition_sort_key)
+        return self._snapshot
+
+    def _owner_record(self, resolution: ResolvedNFT) -> OwnerRecord:
+        listing = self.listings[resolution.nft_id]
+        return OwnerRecord(listing.nft_id, listing.name, resolution.owner_puzzle_hash, listing.edition)
@@ -0,0 +1,151 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+PROFILERS = ("cprofile", "yappi")
+SAMPLE_INTERVAL = 0.005  # seconds between wall-clock stack samples
+SUMMARY_FILES = ("nft.py", "find_owners.py")
+SUMMARY_LIMIT = 15
+
+# Where wall-clock samples are attributed, checked from the innermost frame outwards. chia_rs runs
+# CLVM natively, so SerializedProgram.run_with_cost and run_chia_program leave no frame of their own
+# and their time is sampled in the functions calling them: created_coins and owner_from_layers.
+CATEGORIES = (
+    ("CLVM", ("created_coins", "owner_from_layers", "uncurry_serialized", "run_chia_program", "run_with_cost",
+              "uncurry")),
+    ("MintGarden", ("fetch_collection_items",)),
+    ("node RPC wait", ("select",)),
+)
+
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler for one thread
+    A background thread records the target thread's stack every interval. Time spent waiting,
+    e.g. in the event loop's select() while node calls are in flight, is counted like any other.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+
+    def write_collapsed(self, path: str):
+        """Write stacks in the collapsed format read by flamegraph.pl and speedscope"""
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+    def categories(self) -> Dict[str, int]:
+        totals = Counter()
+        for stack, count in self.stacks.items():
+            totals[_category(stack)] += count
+        return totals
+
+
+def _category(stack: Tuple[str, ...]) -> str:
+    # Innermost frames first, so CLVM run from inside a fetch still counts as CLVM
+    for frame in reversed(stack):
+        name = frame.split(" ", 1)[0]
+        for category, names in CATEGORIES:
+            if name in names:
+                return category
+    return "other"
+
+
+class Profiler:
+    """
+    Profiles a block of code with a deterministic profiler and a wall-clock sampler
+    Writes <prefix>.pstats (readable with pstats or snakeviz) and <prefix>.collapsed, and prints
+    where the wall-clock time went and the hottest functions in nft.py and find_owners.py.
+    cprofile only sees the thread it runs in; yappi (pip install yappi) follows coroutines across
+    awaits and measures wall time.
+    """
+
+    def __init__(self, prefix: str = "profile", profiler: str = "cprofile", interval: float = SAMPLE_INTERVAL):
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler {profiler!r}, expected one of {', '.join(PROFILERS)}")
+        self.prefix = prefix
+        self.profiler = profiler
+        self.sampler = StackSampler(threading.get_ident(), interval)
+        self._profile: Optional[cProfile.Profile] = None
+
+    def __enter__(self) -> "Profiler":
+        if self.profiler == "yappi":
+            try:
+                import yappi
+            except ImportError:
+                raise Exception("--profiler yappi needs yappi (pip install yappi)")
+            yappi.set_clock_type("wall")
+            yappi.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self.sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sampler.stop()
+        pstats_path = f"{self.prefix}.pstats"
+        if self.profiler == "yappi":
+            import yappi
+
+            yappi.stop()
+            yappi.get_func_stats().save(pstats_path, type="pstat")
+            yappi.clear_stats()
+        else:
+            self._profile.disable()
+            self._profile.dump_stats(pstats_path)
+
+        collapsed_path = f"{self.prefix}.collapsed"
+        self.sampler.write_collapsed(collapsed_path)
+        self.print_summary(pstats_path)
+        print(f"Profile written to {pstats_path} and {collapsed_path}")
+
+    def print_summary(self, pstats_path: str):
+        categories = self.sampler.categories()
+        total = sum(categories.values())
+        if total:
+            print(f"\nWall-clock samples ({total} at {self.sampler.interval * 1000:g} ms):")
+            for category, count in categories.most_common():
+                print(f"  {category:<16} {count / total:6.1%}")
+
+        print(f"\nHottest functions in {' and '.join(SUMMARY_FILES)} (cumulative seconds):")
+        for (filename, line, name), calls, cumulative in hot_functions(pstats_path):
+            print(f"  {cumulative:9.3f}  {calls:>8}  {os.path.basename(filename)}:{line}({name})")
+
+
+def hot_functions(pstats_path: str, files=SUMMARY_FILES,
+                  limit: int = SUMMARY_LIMIT) -> List[Tuple[Tuple[str, int, str], int, float]]:
+    """The functions defined in files with the most cumulative time, as (function, calls, seconds)"""
+    stats = pstats.Stats(pstats_path).stats
+    rows = [(function, calls, cumulative)
+            for function, (_, calls, _, cumulative, _) in stats.items()
+            if os.path.basename(function[0]) in files]
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[:limit]
@@ -0,0 +1,181 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+from chia.types.blockchain_format.program import DEFAULT_FLAGS, INFINITE_COST, Program
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.coin_spend import CoinSpend
+from chia.util.ints import uint16
+from chia.wallet.nft_wallet.nft_puzzles import NFT_OWNERSHIP_LAYER_HASH, NFT_STATE_LAYER_MOD_HASH, SINGLETON_MOD_HASH
+from chia_rs import run_chia_program, serialized_length, tree_hash
+
+# Distinct layers remembered; a collection only has a handful, so this only bounds odd input
+LAYER_CACHE_SIZE = 256
+
+# Serialized prefixes of a curried puzzle, (a (q . mod) args), and of each argument, (c (q . arg) rest)
+CURRY_PREFIX = b"\xff\x02\xff\xff\x01"
+CURRIED_ARG_PREFIX = b"\xff\x04\xff\xff\x01"
+CONS = 0xff
+
+# Returned when a spend is not in the shape handled here and has to be parsed in full
+UNHANDLED = object()
+
+
+class PuzzleLayerCache:
+    """
+    Tree hashes of puzzle layers, keyed by their serialization
+    The NFTs of a collection share their singleton, state and ownership layers byte for byte, so
+    each layer is hashed once and later spends recognise it with a dict lookup, instead of
+    comparing the whole tree against the known layer on every spend.
+    """
+
+    def __init__(self, size: int = LAYER_CACHE_SIZE):
+        self.size = size
+        self.hashes: Dict[bytes, bytes32] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def tree_hash(self, serialized: memoryview) -> bytes32:
+        puzzle_hash = self.hashes.get(serialized)
+        if puzzle_hash is not None:
+            self.hits += 1
+            return puzzle_hash
+
+        self.misses += 1
+        if len(self.hashes) >= self.size:
+            del self.hashes[next(iter(self.hashes))]
+        puzzle_hash = self.hashes[bytes(serialized)] = bytes32(tree_hash(serialized))
+        return puzzle_hash
+
+
+LAYER_CACHE = PuzzleLayerCache()
+
+
+def skip(buf: memoryview, pos: int) -> int:
+    """Position just after the serialized program starting at pos"""
+    return pos + serialized_length(buf[pos:])
+
+
+def uncurry_serialized(buf: memoryview) -> Tuple[memoryview, List[memoryview]]:
+    """
+    Split a serialized curried puzzle into its mod and arguments, without parsing either
+    Like Program.uncurry, a puzzle that is not curried is returned as its own mod with no arguments.
+    """
+    if buf[:len(CURRY_PREFIX)] != CURRY_PREFIX:
+        return buf, []
+
+    try:
+        pos = len(CURRY_PREFIX)
+        end = skip(buf, pos)
+        mod = buf[pos:end]
+        if buf[end] != CONS:
+            return buf, []
+
+        args = []
+        pos = end + 1
+        while buf[pos:pos + len(CURRIED_ARG_PREFIX)] == CURRIED_ARG_PREFIX:
+            pos += len(CURRIED_ARG_PREFIX)
+            end = skip(buf, pos)
+            args.append(buf[pos:end])
+            if buf[end] != CONS:
+                return buf, []
+            pos = end + 1
+
+        # The arguments end in the environment, 1, then each list is closed
+        if buf[pos:] != b"\x01" + b"\x80" * (len(args) + 1):
+            return buf, []
+        return mod, args
+    except (ValueError, IndexError):
+        return buf, []
+
+
+def serialized_at(buf: memoryview, path: str) -> memoryview:
+    """The serialized subtree at path, a string of f and r like Program.at"""
+    pos = 0
+    for step in path:
+        if buf[pos] != CONS:
+            raise ValueError(f"Path {path} reaches an atom")
+        pos = pos + 1 if step == "f" else skip(buf, pos + 1)
+    return buf[pos:skip(buf, pos)]
+
+
+def check_uncurried_values(singleton_struct: Program, metadata: Program, current_did: Program,
+                           royalty_address: Program, royalty_percentage: Program):
+    """
+    Read every curried value UncurriedNFT.uncurry reads, with the same conversions
+    Raises wherever uncurry would return None or raise, so that such spends are left to the full path.
+    """
+    singleton_struct.first()
+    singleton_struct.rest().rest()
+    for kv_pair in metadata.as_iter():
+        kv_pair.first().as_atom()
+    uint16(royalty_percentage.as_int())
+    bytes32(royalty_address.as_atom())
+    if current_did.as_atom() != b"":
+        bytes32(current_did.as_atom())
+    # Converted last by uncurry, outside its try, where they raise instead of returning None
+    bytes32(singleton_struct.rest().first().as_atom())
+
+
+def owner_from_layers(spend: CoinSpend, max_cost: int = INFINITE_COST,
+                      cache: PuzzleLayerCache = LAYER_CACHE) -> Union[Optional[bytes32], object]:
+    """
+    Owner puzzle hash of an NFT spend with a DID-capable ownership layer, read from its serialization
+    Only the per-NFT curried values are parsed; the shared layers are recognised by tree hash. Gives
+    the same result as UncurriedNFT.uncurry followed by get_metadata_and_phs, and returns UNHANDLED
+    for anything else, e.g. other puzzles, metadata updates or malformed spends, so the caller can
+    take the full path and get its exact result, exceptions included. A p2 puzzle costing more than
+    max_cost raises ValueError, like nft.created_coins.
+    """
+    try:
+        mod, singleton_args = uncurry_serialized(memoryview(bytes(spend.puzzle_reveal)))
+        if len(singleton_args) != 2 or cache.tree_hash(mod) != SINGLETON_MOD_HASH:
+            return UNHANDLED
+
+        mod, state_args = uncurry_serialized(singleton_args[1])
+        if len(state_args) != 4 or cache.tree_hash(mod) != NFT_STATE_LAYER_MOD_HASH:
+            return UNHANDLED
+        # The NFT mod hash, converted outside uncurry's try like the launcher id
+        bytes32(Program.from_bytes(bytes(state_args[0])).as_atom())
+
+        mod, ownership_args = uncurry_serialized(state_args[3])
+        if len(ownership_args) != 4 or cache.tree_hash(mod) != NFT_OWNERSHIP_LAYER_HASH:
+            return UNHANDLED
+        _, transfer_args = uncurry_serialized(ownership_args[2])
+        if len(transfer_args) != 3:
+            return UNHANDLED
+        check_uncurried_values(Program.from_bytes(bytes(singleton_args[0])),
+                               Program.from_bytes(bytes(state_args[1])),
+                               Program.from_bytes(bytes(ownership_args[1])),
+                               Program.from_bytes(bytes(transfer_args[1])),
+                               Program.from_bytes(bytes(transfer_args[2])))
+
+        # The ownership layer's inner solution is the first item of the state layer's
+        innermost_solution = serialized_at(memoryview(bytes(spend.solution)), "rrfff")
+    except Exception:
+        return UNHANDLED
+
+    try:
+        _, result = run_chia_program(bytes(ownership_args[3]), bytes(innermost_solution), max_cost,
+                                     DEFAULT_FLAGS)
+        conditions = Program.to(result)
+    except ValueError as e:
+        if e.args and e.args[0] == "cost exceeded":
+            raise ValueError(f"Spend of coin {spend.coin.name().hex()} costs more than {max_cost}")
+        return UNHANDLED
+    except Exception:
+        return UNHANDLED
+
+    # The same scan as get_metadata_and_phs: the memo of the first CREATE_COIN of amount 1
+    owner = None
+    try:
+        for condition in conditions.as_iter():
+            if condition.list_len() < 2:
+                continue
+            condition_code = condition.first().as_int()
+            if condition_code == -24:
+                # Metadata updates are applied by the full path, which may reject them
+                return UNHANDLED
+            if condition_code == 51 and condition.rest().rest().first().as_int() == 1 and owner is None:
+                owner = bytes32(condition.at("rrrff").as_atom())
+    except Exception:
+        return UNHANDLED
+    return owner
@@ -0,0 +1,71 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Optional
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.bech32m import encode_puzzle_hash
+
+
+class OwnershipStatus(str, Enum):
+    OWNED = "owned"
+    NOT_FOUND = "not_found"  # launcher coin does not exist
+    NOT_MINTED = "not_minted"  # launcher not spent at target height
+    MELTED = "melted"  # singleton spent without recreating itself
+    UNDECODABLE = "undecodable"  # owner could not be read from the creating spend
+
+
+@dataclass(slots=True)
+class NFTListing:
+    """An NFT as listed by MintGarden for a collection"""
+    nft_id: str
+    name: str
+    edition: Optional[int] = None
+
+
+@dataclass(slots=True)
+class ResolvedNFT:
+    """On-chain ownership of an NFT at a given height"""
+    nft_id: str
+    status: OwnershipStatus
+    owner_puzzle_hash: Optional[bytes32] = None
+    coin_id: Optional[bytes32] = None
+    confirmed_height: Optional[int] = None
+
+    @property
+    def owner(self) -> Optional[str]:
+        if self.owner_puzzle_hash is None:
+            return None
+        return encode_puzzle_hash(self.owner_puzzle_hash, "xch")
+
+
+@dataclass(slots=True)
+class OwnerRecord:
+    """A snapshot entry: an eligible NFT and its owner"""
+    nft_id: str
+    name: str
+    owner_puzzle_hash: bytes32
+    edition: Optional[int] = None
+
+    @property
+    def xch_address(self) -> str:
+        return encode_puzzle_hash(self.owner_puzzle_hash, "xch")
+
+    def to_dict(self) -> Dict:
+        return {
+            "nft_id": self.nft_id,
+            "name": self.name,
+            "xch_address": self.xch_address,
+        }
+
+
+@dataclass(slots=True)
+class ResolutionError:
+    """An NFT whose owner could not be determined"""
+    nft_id: str
+    error: str
+
+    def to_dict(self) -> Dict:
+        return {
+            "nft_id": self.nft_id,
+            "error": self.error,
+        }
@@ -0,0 +1,192 @@
+import asyncio
+from typing import AbstractSet, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+import aiohttp
+from analytics import HolderStats
+from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+from chia.types.blockchain_format.sized_bytes import bytes32
+from nft import resolve_nft_at_height, verify_resolutions, walk_timeline
+from records import NFTListing, OwnerRecord, OwnershipStatus, ResolutionError, ResolvedNFT
+from timeline import OwnershipTimeline
+
+RPC_TIMEOUT = 30  # seconds for a single node call
+RPC_RETRIES = 3  # extra attempts for a node call that timed out or lost its connection
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled on each further attempt
+NFT_TIMEOUT = 300  # seconds for a whole NFT, covering every hop and retry
+CONCURRENCY = 20  # NFTs resolved at the same time
+
+TRANSIENT_ERRORS = (asyncio.TimeoutError, aiohttp.ClientError, ConnectionError)
+
+
+class RetryingFullNodeClient:
+    """
+    FullNodeRpcClient wrapper that bounds every call with a timeout and retries transient failures
+    Timeouts and connection errors are retried with exponential backoff; any other error, or a
+    call that keeps failing, is raised to the caller.
+    """
+
+    def __init__(self, client: FullNodeRpcClient, timeout: float = RPC_TIMEOUT, retries: int = RPC_RETRIES,
+                 backoff: float = RETRY_BACKOFF):
+        self.client = client
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            for attempt in range(self.retries + 1):
+                try:
+                    return await asyncio.wait_for(attr(*args, **kwargs), self.timeout)
+                except TRANSIENT_ERRORS:
+                    if attempt == self.retries:
+                        raise
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+
+        return call
+
+
+class CollectionResolver:
+    """
+    Resolves NFTs concurrently, isolating failures per NFT
+    An NFT that errors or runs past nft_timeout does not affect the others; it is queued and
+    tried once more by retry() after the rest of the collection has been resolved.
+    resolve_nft is called as resolve_nft(client, nft_id, target_height), e.g. walk_timeline to
+    record every hop up to target_height instead of only the ownership at it.
+    """
+
+    def __init__(self, client: FullNodeRpcClient, target_height: int, concurrency: int = CONCURRENCY,
+                 nft_timeout: float = NFT_TIMEOUT,
+                 resolve_nft: Callable[[FullNodeRpcClient, str, int], Awaitable] = resolve_nft_at_height):
+        self.client = client
+        self.target_height = target_height
+        self.nft_timeout = nft_timeout
+        self.resolve_nft = resolve_nft
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.retry_queue: List[str] = []
+
+    async def resolve(self, nft_ids: List[str]) -> List[ResolvedNFT]:
+        """Resolve nft_ids, returning the successes in input order and queueing the failures"""
+        outcomes = await asyncio.gather(*(self._resolve_one(nft_id) for nft_id in nft_ids))
+
+        resolutions = []
+        for outcome in outcomes:
+            if isinstance(outcome, ResolutionError):
+                print(f"Failed to process NFT {outcome.nft_id}, will retry: {outcome.error}")
+                self.retry_queue.append(outcome.nft_id)
+            else:
+                resolutions.append(outcome)
+        return resolutions
+
+    async def retry(self) -> Tuple[List[ResolvedNFT], List[ResolutionError]]:
+        """Give every queued NFT one more attempt, returning what resolved and what still failed"""
+        queued, self.retry_queue = self.retry_queue, []
+        if queued:
+            print(f"\nRetrying {len(queued)} NFTs that failed...")
+
+        outcomes = await asyncio.gather(*(self._resolve_one(nft_id) for nft_id in queued))
+        resolutions = [o for o in outcomes if not isinstance(o, ResolutionError)]
+        errors = [o for o in outcomes if isinstance(o, ResolutionError)]
+        return resolutions, errors
+
+    async def _resolve_one(self, nft_id: str) -> Union[ResolvedNFT, ResolutionError]:
+        async with self.semaphore:
+            try:
+                return await asyncio.wait_for(self.resolve_nft(self.client, nft_id, self.target_height),
+                                              self.nft_timeout)
+            except asyncio.TimeoutError:
+                return ResolutionError(nft_id, f"Timed out after {self.nft_timeout} seconds")
+            except Exception as e:
+                return ResolutionError(nft_id, str(e))
+
+
+class OwnerResolver:
+    """
+    Resolves NFTs to their eligible owner records, for scans and the streaming library alike
+    Owners that are excluded, or have not held the NFT since held_since, are dropped, and NFTs
+    without an owner are added to errors. Owners still have to be checked with verify() before
+    they count. resolutions, when given, is filled with every NFT's resolution, whatever its status.
+    """
+
+    def __init__(self, client: FullNodeRpcClient, listings_by_id: Mapping[str, NFTListing], target_height: int,
+                 concurrency: int = CONCURRENCY, nft_timeout: float = NFT_TIMEOUT,
+                 excluded: AbstractSet[bytes32] = frozenset(), held_since: Optional[int] = None,
+                 timelines: Optional[Dict[str, OwnershipTimeline]] = None, stats: Optional[HolderStats] = None,
+                 errors: Optional[List[ResolutionError]] = None,
+                 resolutions: Optional[Dict[str, ResolvedNFT]] = None):
+        self.client = client
+        self.listings_by_id = listings_by_id
+        self.target_height = target_height
+        self.excluded = excluded
+        self.held_since = held_since
+        self.timelines = timelines
+        self.stats = stats
+        self.errors = errors if errors is not None else []
+        self.resolutions = resolutions
+        # A full timeline costs the same node calls as resolving at target_height, so walk one when
+        # ownership at earlier heights is needed too
+        use_timelines = held_since is not None or timelines is not None
+        self.resolver = CollectionResolver(client, target_height, concurrency, nft_timeout,
+                                           walk_timeline if use_timelines else resolve_nft_at_height)
+
+    @property
+    def queued(self) -> List[str]:
+        """NFTs waiting for retry()"""
+        return self.resolver.retry_queue
+
+    async def resolve(self, nft_ids: List[str]) -> List[Tuple[OwnerRecord, ResolvedNFT]]:
+        """Eligible owners of nft_ids, in input order; NFTs that fail are queued for retry()"""
+        return self._owners(await self.resolver.resolve(nft_ids))
+
+    async def retry(self) -> List[Tuple[OwnerRecord, ResolvedNFT]]:
+        """Eligible owners of the queued NFTs, adding the ones that fail again to errors"""
+        retried, failures = await self.resolver.retry()
+        owners = self._owners(retried)
+        self.errors.extend(failures)
+        return owners
+
+    async def verify(self, resolutions: Iterable[ResolvedNFT]) -> Set[str]:
+        """
+        Check owners against bulk coin record lookups
+        Returns the ids of the NFTs whose coin was not unspent at target_height, which are added to errors.
+        """
+        failed = [r.nft_id for r in await verify_resolutions(self.client, resolutions, self.target_height)]
+        self.errors.extend(ResolutionError(nft_id, f"Coin was not unspent at height {self.target_height}")
+                           for nft_id in failed)
+        return set(failed)
+
+    def _owners(self, outcomes: Iterable[Union[ResolvedNFT, OwnershipTimeline]]
+                ) -> List[Tuple[OwnerRecord, ResolvedNFT]]:
+        return [owner for owner in map(self._owner, outcomes) if owner is not None]
+
+    def _owner(self, outcome: Union[ResolvedNFT, OwnershipTimeline]) -> Optional[Tuple[OwnerRecord, ResolvedNFT]]:
+        nft_id = outcome.nft_id
+        resolution = outcome
+        if isinstance(outcome, OwnershipTimeline):
+            if self.timelines is not None:
+                self.timelines[nft_id] = outcome
+            resolution = outcome.resolution_at(self.target_height)
+            if (self.held_since is not None and resolution.status == OwnershipStatus.OWNED
+                    and not outcome.held_continuously(self.held_since, self.target_height)):
+                print(f"{nft_id} has not been held since height {self.held_since}")
+                return None
+
+        if self.resolutions is not None:
+            self.resolutions[nft_id] = resolution
+        if resolution.status != OwnershipStatus.OWNED:
+            print(f"{nft_id} has no owner at height {self.target_height}: {resolution.status.value}")
+            self.errors.append(ResolutionError(nft_id, f"No owner information found ({resolution.status.value})"))
+            return None
+
+        # Skip excluded addresses, counting them in the holder statistics
+        if resolution.owner_puzzle_hash in self.excluded:
+            if self.stats is not None:
+                self.stats.add_excluded(resolution.owner_puzzle_hash)
+            return None
+
+        print(f"{nft_id} owner: {resolution.owner}")
+        listing = self.listings_by_id[nft_id]
+        return OwnerRecord(nft_id, listing.name, resolution.owner_puzzle_hash, listing.edition), resolution
@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.coin_record import CoinRecord
+from chia.types.coin_spend import CoinSpend
+
+DEFAULT_STORE_PATH = "rpc_cache.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Blocks below the peak after which a spend is treated as final and safe to keep across runs
+STABLE_DEPTH = 32
+# Seconds to wait for another process, e.g. a scan shard, to release the database's write lock
+SQLITE_TIMEOUT = 30
+# Responses stored per transaction
+PUT_BATCH_SIZE = 500
+
+COIN_RECORD = "coin_record"
+PUZZLE_AND_SOLUTION = "puzzle_and_solution"
+CHILDREN = "children"
+
+
+class RpcStore:
+    """
+    Persistent, content-addressed store of immutable full node responses
+    Responses are kept once per distinct content in `blobs` (keyed by sha256) and referenced from
+    `entries` by (kind, coin id, height). Least recently used entries are evicted when the blobs
+    grow past max_bytes, and the database file is compacted afterwards. New responses are written
+    PUT_BATCH_SIZE at a time, and the rest on close.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path, timeout=SQLITE_TIMEOUT)
+        # Readers in other processes are not blocked by a commit, and commits do not wait for an fsync
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest BLOB PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                kind TEXT NOT NULL,
+                coin_id BLOB NOT NULL,
+                height INTEGER NOT NULL,
+                digest BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (kind, coin_id, height)
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+        """)
+        # Access times are written back in one batch on close instead of on every hit
+        self._used: Dict[Tuple[str, bytes, int], int] = {}
+        # Responses not written yet, by (kind, coin id, height)
+        self._pending: Dict[Tuple[str, bytes, int], bytes] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind: str, coin_id: bytes32, height: int) -> Optional[bytes]:
+        data = self._pending.get((kind, bytes(coin_id), height))
+        if data is not None:
+            self.hits += 1
+            return data
+
+        row = self.db.execute(
+            "SELECT blobs.data FROM entries JOIN blobs ON blobs.digest = entries.digest "
+            "WHERE entries.kind = ? AND entries.coin_id = ? AND entries.height = ?",
+            (kind, bytes(coin_id), height)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._used[(kind, bytes(coin_id), height)] = int(time.time())
+        return row[0]
+
+    def put(self, kind: str, coin_id: bytes32, height: int, data: bytes):
+        self._pending[(kind, bytes(coin_id), height)] = data
+        if len(self._pending) >= PUT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write the pending responses in one transaction"""
+        if not self._pending:
+            return
+
+        now = int(time.time())
+        blobs = {}
+        entries = []
+        for (kind, coin_id, height), data in self._pending.items():
+            digest = hashlib.sha256(data).digest()
+            blobs[digest] = data
+            entries.append((kind, coin_id, height, digest, now))
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO blobs (digest, data, size) VALUES (?, ?, ?)",
+                                [(digest, data, len(data)) for digest, data in blobs.items()])
+            self.db.executemany("INSERT OR REPLACE INTO entries (kind, coin_id, height, digest, last_used) "
+                                "VALUES (?, ?, ?, ?, ?)", entries)
+        self._pending.clear()
+
+    def size(self) -> int:
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the store fits in max_bytes, returns bytes freed"""
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return 0
+
+        freed = 0
+        with self.db:
+            rows = self.db.execute("SELECT kind, coin_id, height, digest FROM entries ORDER BY last_used").fetchall()
+            for kind, coin_id, height, digest in rows:
+                if freed >= excess:
+                    break
+                self.db.execute("DELETE FROM entries WHERE kind = ? AND coin_id = ? AND height = ?",
+                                (kind, coin_id, height))
+                if self.db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+                    freed += self.db.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()[0]
+                    self.db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        return freed
+
+    def compact(self):
+        """Remove unreferenced blobs and shrink the database file"""
+        with self.db:
+            self.db.execute("DELETE FROM blobs WHERE digest NOT IN (SELECT digest FROM entries)")
+        self.db.execute("VACUUM")
+
+    def close(self):
+        self.flush()
+        with self.db:
+            self.db.executemany("UPDATE entries SET last_used = ? WHERE kind = ? AND coin_id = ? AND height = ?",
+                                [(used, *key) for key, used in self._used.items()])
+        self._used.clear()
+        if self.evict():
+            self.compact()
+        self.db.close()
+
+
+class CachingFullNodeClient:
+    """
+    FullNodeRpcClient wrapper that answers historical lookups from an RpcStore
+    Only spends, spent coin records and the children of spends at or below stable_height are
+    stored, everything else is passed straight to the node. Methods that are not cached are
+    delegated unchanged.
+    """
+
+    def __init__(self, client: FullNodeRpcClient, store: RpcStore, stable_height: int):
+        self.client = client
+        self.store = store
+        self.stable_height = stable_height
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def get_puzzle_and_solution(self, coin_id: bytes32, height: int) -> Optional[CoinSpend]:
+        if height > self.stable_height:
+            return await self.client.get_puzzle_and_solution(coin_id, height)
+
+        data = self.store.get(PUZZLE_AND_SOLUTION, coin_id, height)
+        if data is not None:
+            return CoinSpend.from_bytes(data)
+
+        spend = await self.client.get_puzzle_and_solution(coin_id, height)
+        if spend is not None:
+            self.store.put(PUZZLE_AND_SOLUTION, coin_id, height, bytes(spend))
+        return spend
+
+    async def get_coin_record_by_name(self, coin_id: bytes32) -> Optional[CoinRecord]:
+        # Spent records are keyed at height 0 since the spent height is only known once fetched
+        data = self.store.get(COIN_RECORD, coin_id, 0)
+        if data is not None:
+            return CoinRecord.from_bytes(data)
+
+        record = await self.client.get_coin_record_by_name(coin_id)
+        self._put_coin_record(record)
+        return record
+
+    async def get_coin_records_by_parent_ids(self, parent_ids: List[bytes32], include_spent_coins: bool = True,
+                                             start_height: Optional[int] = None,
+                                             end_height: Optional[int] = None) -> List[CoinRecord]:
+        # The coins a stable spend created never change, so for the singleton walk's lookup of one
+        # spend's children their ids are stored and each record is answered like get_coin_record_by_name
+        if (len(parent_ids) != 1 or not include_spent_coins or start_height is None
+                or end_height != start_height + 1 or start_height > self.stable_height):
+            return await self.client.get_coin_records_by_parent_ids(parent_ids, include_spent_coins, start_height,
+                                                                    end_height)
+
+        data = self.store.get(CHILDREN, parent_ids[0], start_height)
+        if data is not None:
+            names = [bytes32(data[start:start + 32]) for start in range(0, len(data), 32)]
+            records = await asyncio.gather(*(self.get_coin_record_by_name(name) for name in names))
+            return [record for record in records if record is not None]
+
+        records = await self.client.get_coin_records_by_parent_ids(parent_ids, include_spent_coins, start_height,
+                                                                   end_height)
+        self.store.put(CHILDREN, parent_ids[0], start_height, b"".join(bytes(record.name) for record in records))
+        for record in records:
+            self._put_coin_record(record)
+        return records
+
+    def _put_coin_record(self, record: Optional[CoinRecord]):
+        if record is not None and record.spent and record.spent_block_index <= self.stable_height:
+            self.store.put(COIN_RECORD, record.name, 0, bytes(record))
+
+    def close(self):
+        self.store.close()
+        self.client.close()
+
+
+async def open_caching_client(client: FullNodeRpcClient, path: str = DEFAULT_STORE_PATH,
+                              max_bytes: int = DEFAULT_MAX_BYTES) -> CachingFullNodeClient:
+    """Wrap client with a store at path, treating spends STABLE_DEPTH blocks below the peak as final"""
+    state = await client.get_blockchain_state()
+    stable_height = state["peak"].height - STABLE_DEPTH
+    return CachingFullNodeClient(client, RpcStore(path, max_bytes), stable_height)
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import AbstractSet, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from analytics import HolderStats
+from draw import launcher_id
+from metadata_index import MetadataIndex, NFTMetadata
+from records import NFTListing, OwnerRecord, ResolutionError, ResolvedNFT
+from spill import MemoryBudget, RecordList, budget_from_mib, record_list
+
+# NFTs a worker resolves concurrently at a time, the size of a MintGarden page
+SHARD_BATCH_SIZE = 100
+
+
+def shard_of(nft_id: str, shards: int) -> int:
+    """Shard an NFT is resolved in: its launcher id modulo the number of shards, whatever the listing order"""
+    return int.from_bytes(launcher_id(nft_id), "big") % shards
+
+
+def shard_path(output_file: str, index: int) -> str:
+    """File a shard's results are streamed to, e.g. nft_results.shard-0.ndjson"""
+    return f"{os.path.splitext(output_file)[0]}.shard-{index}.ndjson"
+
+
+@dataclass(slots=True)
+class ShardTask:
+    """Everything a worker process needs to resolve one shard of a collection"""
+    index: int
+    path: str
+    listings: List[NFTListing]
+    target_height: int
+    excluded: AbstractSet[bytes]
+    concurrency: int = 20
+    nft_timeout: float = 300
+    rpc_cache: Optional[str] = None
+    node_db: Optional[str] = None
+    held_since: Optional[int] = None
+    also_at: Sequence[int] = ()
+
+
+def run_shard(task: ShardTask) -> int:
+    """Worker process entry point: resolve a shard with its own node client and event loop"""
+    return asyncio.run(resolve_shard(task))
+
+
+async def resolve_shard(task: ShardTask) -> int:
+    """
+    Resolve the NFTs of a shard, appending each batch's results to task.path, one JSON line per entry
+    A batch is verified, written and flushed as soon as it is resolved, and ends with a line listing
+    the NFTs it settled, so whatever a worker wrote before it died can still be merged. NFTs that
+    fail are settled by the retry at the end. Returns the number of eligible owners found.
+    """
+    from find_owners import connect_full_node, holders_at, print_node_client_stats, wrap_node_client
+    from resolver import OwnerResolver
+
+    client = await connect_full_node()
+    if client is None:
+        raise Exception(f"Shard {task.index} could not connect to the full node")
+    client = await wrap_node_client(client, task.rpc_cache, task.node_db)
+
+    try:
+        listings_by_id = {listing.nft_id: listing for listing in task.listings}
+        nft_ids = list(listings_by_id)
+        timelines = {} if task.also_at else None
+        resolver = OwnerResolver(client, listings_by_id, task.target_height, task.concurrency, task.nft_timeout,
+                                 task.excluded, task.held_since, timelines, HolderStats())
+        owners = 0
+        errors = 0
+
+        with open(task.path, "w") as f:
+            async def write(resolved: List[Tuple[OwnerRecord, ResolvedNFT]], settled: List[str]):
+                nonlocal owners, errors
+                failed = await resolver.verify([resolution for _, resolution in resolved])
+                for record, _ in resolved:
+                    if record.nft_id not in failed:
+                        f.write(json.dumps({"owner": owner_entry(record)}) + "\n")
+                        owners += 1
+                for error in resolver.errors:
+                    f.write(json.dumps({"error": error.to_dict()}) + "\n")
+                errors += len(resolver.errors)
+                resolver.errors.clear()
+                for puzzle_hash, count in resolver.stats.excluded_entries():
+                    f.write(json.dumps({"excluded": {"owner_puzzle_hash": puzzle_hash, "nfts": count}}) + "\n")
+                resolver.stats = HolderStats()
+                if timelines is not None:
+                    # Timelines are only needed for the holders at earlier heights, written here once
+                    walked = {nft_id: timelines.pop(nft_id) for nft_id in settled if nft_id in timelines}
+                    for height in task.also_at:
+                        for record in holders_at(walked, listings_by_id, task.excluded, height):
+                            f.write(json.dumps({"height": height, "holder": owner_entry(record)}) + "\n")
+                f.write(json.dumps({"settled": settled}) + "\n")
+                f.flush()
+
+            for start in range(0, len(nft_ids), SHARD_BATCH_SIZE):
+                batch = nft_ids[start:start + SHARD_BATCH_SIZE]
+                print(f"\nShard {task.index}: processing {len(batch)} NFTs ({start + len(batch)} total)")
+                resolved = await resolver.resolve(batch)
+                queued = set(resolver.queued)
+                await write(resolved, [nft_id for nft_id in batch if nft_id not in queued])
+
+            # NFTs that failed get one more attempt once everything else is done
+            retried = list(resolver.queued)
+            await write(await resolver.retry(), retried)
+
+        print(f"\nShard {task.index}: {owners} owners, {errors} errors")
+        print_node_client_stats(client)
+        return owners
+    finally:
+        client.close()
+
+
+def owner_entry(record: OwnerRecord) -> Dict:
+    return {
+        "nft_id": record.nft_id,
+        "name": record.name,
+        "edition": record.edition,
+        "owner_puzzle_hash": bytes(record.owner_puzzle_hash).hex(),
+    }
+
+
+def owner_from_entry(entry: Dict) -> OwnerRecord:
+    from chia.types.blockchain_format.sized_bytes import bytes32
+
+    return OwnerRecord(entry["nft_id"], entry["name"], bytes32.fromhex(entry["owner_puzzle_hash"]), entry["edition"])
+
+
+def read_shard(path: str) -> Iterator[Dict]:
+    """Entries of a shard file, stopping at a line a worker did not finish writing"""
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            if not line.endswith("\n"):
+                return
+            yield json.loads(line)
+
+
+def merge_shards(paths: Sequence[str], also_at: Sequence[int] = (), budget: Optional[MemoryBudget] = None,
+                 stats: Optional[HolderStats] = None, unfinished: Optional[Dict[str, Tuple[List[str], str]]] = None
+                 ) -> Tuple[RecordList[OwnerRecord], List[ResolutionError], Dict[int, List[OwnerRecord]]]:
+    """
+    Combine shard files into the results of the whole collection, removing them afterwards
+    Owner records come out in shard order and are put in snapshot order by the caller's sort;
+    errors are ordered by NFT id, so the outcome does not depend on the split or on which
+    worker finished first. Under a memory budget the owner records are collected in a SpillList.
+    The NFTs each shard found held by excluded owners are counted in stats.
+    Files of workers that failed are merged as far as they were written: unfinished maps their
+    path to the shard's NFT ids and the failure, and the NFTs the file does not settle become errors.
+    Returns:
+        The owner records, the errors and the holders at each also_at height
+    """
+    from chia.types.blockchain_format.sized_bytes import bytes32
+
+    results: RecordList[OwnerRecord] = record_list(budget)
+    errors: List[ResolutionError] = []
+    holders: Dict[int, List[OwnerRecord]] = {height: [] for height in also_at}
+    unfinished = unfinished or {}
+    for path in paths:
+        settled = set()
+        for entry in read_shard(path):
+            if "owner" in entry:
+                results.append(owner_from_entry(entry["owner"]))
+                settled.add(entry["owner"]["nft_id"])
+            elif "error" in entry:
+                errors.append(ResolutionError(entry["error"]["nft_id"], entry["error"]["error"]))
+                settled.add(entry["error"]["nft_id"])
+            elif "excluded" in entry:
+                if stats is not None:
+                    stats.add_excluded(bytes32.fromhex(entry["excluded"]["owner_puzzle_hash"]),
+                                       entry["excluded"]["nfts"])
+            elif "settled" in entry:
+                settled.update(entry["settled"])
+            else:
+                holders[entry["height"]].append(owner_from_entry(entry["holder"]))
+
+        if path in unfinished:
+            nft_ids, failure = unfinished[path]
+            errors.extend(ResolutionError(nft_id, failure) for nft_id in nft_ids if nft_id not in settled)
+
+    errors.sort(key=lambda error: error.nft_id)
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+    return results, errors, holders
+
+
+async def scan_shards(collection_id: str, target_height: int, shards: int, output_file: str,
+                      metadata: MetadataIndex, excluded: AbstractSet[bytes],
+                      eligible: Optional[Callable[[NFTMetadata], bool]] = None, concurrency: int = 20,
+                      nft_timeout: float = 300, rpc_cache: Optional[str] = None, node_db: Optional[str] = None,
+                      held_since: Optional[int] = None, also_at: Sequence[int] = (),
+                      memory_budget: Optional[int] = None, stats: Optional[HolderStats] = None
+                      ) -> Tuple[RecordList[OwnerRecord], List[ResolutionError], Dict[int, List[OwnerRecord]]]:
+    """
+    Resolve a collection in worker processes, one per shard, and merge their results
+    The collection is listed once, here, and split by launcher id. Each worker connects to the node
+    itself, resolves its shard with the same resolver, retries and verification as a single process
+    scan and streams the results to a shard file, which are merged once every worker has finished.
+    Args:
+        collection_id: The collection ID from MintGarden
+        target_height: Block height ownership is resolved at
+        shards: Number of worker processes
+        output_file: Snapshot path the shard files are named after
+        metadata: Index that every listed NFT's metadata is added to
+        excluded: Owner puzzle hashes that are not eligible
+        eligible: Metadata filter; NFTs it rejects are not handed to a worker
+        memory_budget: MiB of memory the merge may use before owner records are spilled to disk
+        stats: Holder statistics the NFTs held by excluded owners are counted in
+    Returns:
+        The owner records, the errors and the holders at each also_at height
+    """
+    from find_owners import eligible_batches
+
+    listings_by_id: Dict[str, NFTListing] = {}
+    partitions: List[List[NFTListing]] = [[] for _ in range(shards)]
+    for batch in eligible_batches(collection_id, listings_by_id, metadata, eligible):
+        for nft_id in batch:
+            partitions[shard_of(nft_id, shards)].append(listings_by_id[nft_id])
+
+    tasks = [ShardTask(index, shard_path(output_file, index), listings, target_height, excluded, concurrency,
+                       nft_timeout, rpc_cache, node_db, held_since, also_at)
+             for index, listings in enumerate(partitions) if listings]
+    print(f"\nResolving {sum(len(task.listings) for task in tasks)} NFTs in {len(tasks)} worker processes")
+
+    # Workers are started fresh rather than forked from a process with an event loop running
+    with ProcessPoolExecutor(len(tasks) or 1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        outcomes = await asyncio.gather(*(asyncio.wrap_future(pool.submit(run_shard, task)) for task in tasks),
+                                        return_exceptions=True)
+
+    # A worker that failed leaves the NFTs it had not written yet as errors
+    unfinished = {}
+    for task, outcome in zip(tasks, outcomes):
+        if isinstance(outcome, BaseException):
+            print(f"Shard {task.index} failed: {outcome}")
+            unfinished[task.path] = ([listing.nft_id for listing in task.listings], f"Shard worker failed: {outcome}")
+
+    budget = budget_from_mib(memory_budget)
+    return merge_shards([task.path for task in tasks], also_at, budget, stats, unfinished)
@@ -0,0 +1,73 @@
+import json
+import os
+from typing import Container, Dict, Iterable, List, Optional
+
+from analytics import HolderStats
+from exporters import ExportPipeline
+from records import OwnerRecord
+
+
+def write_snapshot(path: str, records: Iterable[OwnerRecord], keep: Container[int] = (),
+                   export: Optional[ExportPipeline] = None, keep_ids: Container[str] = (),
+                   stats: Optional[HolderStats] = None) -> Dict[int, OwnerRecord]:
+    """
+    Stream owner records to a JSON file, one record at a time
+    The output is identical to json.dump(records, indent=2).
+    Args:
+        path: File to write
+        records: Owner records in output order
+        keep: Positions of records to hand back to the caller, e.g. drawn winners
+        export: Pipeline that also receives every entry with its position
+        keep_ids: NFT ids of further records to hand back, e.g. winners drawn by id
+        stats: Holder statistics every record's owner is counted in as it is written
+    Returns:
+        The records at the requested positions, keyed by position
+    """
+    kept = {}
+    with open(path, "w") as f:
+        f.write("[")
+        position = -1
+        for position, record in enumerate(records):
+            if position in keep or record.nft_id in keep_ids:
+                kept[position] = record
+            if stats is not None:
+                stats.add(record.owner_puzzle_hash)
+            entry_dict = record.to_dict()
+            if export is not None:
+                export.write({"position": position, **entry_dict})
+            entry = json.dumps(entry_dict, indent=2).replace("\n", "\n  ")
+            f.write(f"{',' if position else ''}\n  {entry}")
+        f.write("\n]" if position >= 0 else "]")
+
+    return kept
+
+
+def read_snapshot(path: str) -> List[Dict]:
+    """Snapshot entries as written by write_snapshot, in snapshot order"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def meta_path(path: str) -> str:
+    """Path of the metadata file stored next to a snapshot, e.g. nft_results.meta.json"""
+    return f"{os.path.splitext(path)[0]}.meta.json"
+
+
+def write_snapshot_meta(path: str, collection_id: str, target_height: int, header_hash: bytes, count: int,
+                        sampler: str):
+    """
+    Record what a snapshot was taken from, so winners can be re-drawn without a node
+    """
+    with open(meta_path(path), "w") as f:
+        json.dump({
+            "collection_id": collection_id,
+            "target_height": target_height,
+            "header_hash": header_hash.hex(),
+            "count": count,
+            "sampler": sampler,
+        }, f, indent=2)
+
+
+def read_snapshot_meta(path: str) -> Dict:
+    with open(meta_path(path)) as f:
+        return json.load(f)
@@ -0,0 +1,91 @@
+import heapq
+import itertools
+import pickle
+import re
+import sys
+import tempfile
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Sized, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Records sorted in memory before a run is spilled to disk
+SORT_CHUNK_SIZE = 100_000
+
+EDITION_PATTERN = re.compile(r"\d+")
+
+
+def parse_edition(name: str, edition_number: Optional[int] = None) -> Optional[int]:
+    """
+    Edition number of an NFT, preferring MintGarden's edition_number over digits in the name
+    """
+    if edition_number is not None:
+        return int(edition_number)
+
+    match = EDITION_PATTERN.search(name or "")
+    if match is None:
+        return None
+    return int(match.group())
+
+
+def edition_sort_key(record) -> Tuple[int, str]:
+    # NFTs without an edition sort last, nft_id breaks ties so ordering is deterministic
+    edition = record.edition if record.edition is not None else sys.maxsize
+    return edition, record.nft_id
+
+
+def external_sort(records: Iterable[T], key: Callable[[T], object] = edition_sort_key,
+                  chunk_size: int = SORT_CHUNK_SIZE) -> Iterator[T]:
+    """
+    Yield records in key order, merging sorted runs spilled to temporary files
+    An input list is drained as runs are spilled so only one run is held in memory at a time,
+    and any other iterable, e.g. a SpillList, is read one run at a time. Small inputs are sorted
+    in memory without touching disk, lists in place.
+    """
+    if isinstance(records, Sized) and len(records) <= chunk_size:
+        if not isinstance(records, list):
+            records = list(records)
+        records.sort(key=key)
+        yield from records
+        return
+
+    runs: List[BinaryIO] = []
+    try:
+        for run in _drain(records, chunk_size) if isinstance(records, list) else _chunks(records, chunk_size):
+            run.sort(key=key)
+            runs.append(_spill(run))
+
+        yield from heapq.merge(*(_read_run(run) for run in runs), key=key)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _drain(records: List[T], chunk_size: int) -> Iterator[List[T]]:
+    while records:
+        run = records[-chunk_size:]
+        del records[-chunk_size:]
+        yield run
+
+
+def _chunks(records: Iterable[T], chunk_size: int) -> Iterator[List[T]]:
+    records = iter(records)
+    while run := list(itertools.islice(records, chunk_size)):
+        yield run
+
+
+def _spill(run: List[T]) -> BinaryIO:
+    spool = tempfile.TemporaryFile()
+    pickler = pickle.Pickler(spool, protocol=pickle.HIGHEST_PROTOCOL)
+    for record in run:
+        pickler.dump(record)
+    spool.seek(0)
+    return spool
+
+
+def _read_run(spool: BinaryIO) -> Iterator[T]:
+    unpickler = pickle.Unpickler(spool)
+    while True:
+        try:
+            yield unpickler.load()
+        except EOFError:
+            return
@@ -0,0 +1,112 @@
+import os
+import pickle
+import tempfile
+from typing import BinaryIO, Generic, Iterable, Iterator, List, Optional, TypeVar, Union
+
+T = TypeVar("T")
+
+# Records appended to a SpillList between checks of the process's memory use
+MEMORY_CHECK_INTERVAL = 1_000
+
+
+def resident_memory() -> int:
+    """
+    Resident set size of this process in bytes
+    Read from /proc on Linux; elsewhere the peak so far is used, which only makes a budget trip sooner.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        import sys
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in bytes on macOS and in kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryBudget:
+    """
+    Limit on the process's resident memory, past which record lists move their contents to disk
+    Once exceeded the budget stays exceeded, so a run does not flip back and forth between modes.
+    """
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = limit_bytes
+        self.exceeded = False
+
+    def check(self) -> bool:
+        if not self.exceeded and resident_memory() > self.limit_bytes:
+            print(f"\nMemory use passed the {self.limit_bytes // 2 ** 20} MiB budget, spilling results to disk")
+            self.exceeded = True
+        return self.exceeded
+
+
+def budget_from_mib(mib: Optional[int]) -> Optional[MemoryBudget]:
+    """Budget for a --memory-budget given in MiB, None when it was not given"""
+    return MemoryBudget(mib * 2 ** 20) if mib is not None else None
+
+
+class SpillList(Generic[T]):
+    """
+    Append-only list of records that moves them to a temporary file once its memory budget is exceeded
+    Records are pickled in append order and iterating yields all of them in that order, spilled
+    ones first, without loading them back into memory at once.
+    """
+
+    def __init__(self, budget: MemoryBudget):
+        self.budget = budget
+        self.memory: List[T] = []
+        self.spool: Optional[BinaryIO] = None
+        self.spilled = 0
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.memory)
+
+    def append(self, record: T):
+        self.memory.append(record)
+        if len(self.memory) % MEMORY_CHECK_INTERVAL == 0 and self.budget.check():
+            self.spill()
+
+    def extend(self, records: Iterable[T]):
+        for record in records:
+            self.append(record)
+
+    def spill(self):
+        """Move the records held in memory to the end of the spool file"""
+        if self.spool is None:
+            self.spool = tempfile.TemporaryFile()
+        self.spool.seek(0, os.SEEK_END)
+        pickler = pickle.Pickler(self.spool, protocol=pickle.HIGHEST_PROTOCOL)
+        for record in self.memory:
+            pickler.dump(record)
+            # Records are independent, so the memo is only a growing set of references to them
+            pickler.clear_memo()
+        self.spilled += len(self.memory)
+        self.memory.clear()
+
+    def __iter__(self) -> Iterator[T]:
+        # Each iteration keeps its own file offset, so several can run side by side
+        offset = 0
+        for _ in range(self.spilled):
+            self.spool.seek(offset)
+            record = pickle.load(self.spool)
+            offset = self.spool.tell()
+            yield record
+        yield from self.memory
+
+    def close(self):
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+        self.spilled = 0
+        self.memory.clear()
+
+
+RecordList = Union[List[T], SpillList[T]]
+
+
+def record_list(budget: Optional[MemoryBudget] = None) -> RecordList:
+    """A plain list without a budget, otherwise a SpillList under it"""
+    return [] if budget is None else SpillList(budget)
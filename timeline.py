@@ -0,0 +1,79 @@
+import bisect
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from records import OwnershipStatus, ResolvedNFT
+
+
+@dataclass(slots=True)
+class OwnershipHop:
+    """One singleton coin of an NFT: created at start_height, owned by owner_puzzle_hash until the next hop"""
+    start_height: int
+    coin_id: bytes32
+    owner_puzzle_hash: Optional[bytes32]
+
+
+@dataclass(slots=True)
+class OwnershipTimeline:
+    """
+    Every coin of an NFT's singleton up to until_height, in order
+    Built by a single lineage walk; ownership at any height up to until_height is read from it
+    without further node calls.
+    """
+    nft_id: str
+    until_height: int
+    launcher_id: Optional[bytes32] = None
+    launcher_height: Optional[int] = None
+    minted_height: Optional[int] = None
+    melted_height: Optional[int] = None
+    hops: List[OwnershipHop] = field(default_factory=list)
+
+    def _hop_index(self, height: int) -> int:
+        """Index of the hop unspent at height, -1 before the NFT was minted"""
+        if height > self.until_height:
+            raise ValueError(f"Timeline of {self.nft_id} only reaches height {self.until_height}")
+        return bisect.bisect_right([hop.start_height for hop in self.hops], height) - 1
+
+    def resolution_at(self, height: int) -> ResolvedNFT:
+        """The same result resolve_nft_at_height gives for height"""
+        if self.launcher_id is None:
+            return ResolvedNFT(self.nft_id, OwnershipStatus.NOT_FOUND)
+
+        index = self._hop_index(height)
+        if self.melted_height is not None and self.melted_height <= height:
+            last = self.hops[-1] if self.hops else OwnershipHop(self.launcher_height, self.launcher_id, None)
+            return ResolvedNFT(self.nft_id, OwnershipStatus.MELTED, coin_id=last.coin_id,
+                               confirmed_height=last.start_height)
+        if index < 0:
+            return ResolvedNFT(self.nft_id, OwnershipStatus.NOT_MINTED, coin_id=self.launcher_id,
+                               confirmed_height=self.launcher_height)
+
+        hop = self.hops[index]
+        if hop.owner_puzzle_hash is None:
+            return ResolvedNFT(self.nft_id, OwnershipStatus.UNDECODABLE, coin_id=hop.coin_id,
+                               confirmed_height=hop.start_height)
+        return ResolvedNFT(self.nft_id, OwnershipStatus.OWNED, hop.owner_puzzle_hash, hop.coin_id, hop.start_height)
+
+    def owner_at(self, height: int) -> Optional[bytes32]:
+        resolution = self.resolution_at(height)
+        return resolution.owner_puzzle_hash if resolution.status == OwnershipStatus.OWNED else None
+
+    def held_since(self, height: int) -> Optional[int]:
+        """
+        Height from which the owner at height has held the NFT without interruption, or None if unowned
+        Transfers that keep the same owner, e.g. metadata updates, do not interrupt the holding.
+        """
+        owner = self.owner_at(height)
+        if owner is None:
+            return None
+
+        index = self._hop_index(height)
+        while index > 0 and self.hops[index - 1].owner_puzzle_hash == owner:
+            index -= 1
+        return self.hops[index].start_height
+
+    def held_continuously(self, since: int, height: int) -> bool:
+        """Whether the owner at height has held the NFT since height `since` or earlier"""
+        start = self.held_since(height)
+        return start is not None and start <= since